@@ -15,18 +15,35 @@ import sys
 import os
 import shutil
 import glob
+import lzma
 import re
+from fnmatch import fnmatch
 
 
 from plistyamlplist_lib.plist_yaml import plist_yaml
 from plistyamlplist_lib.yaml_plist import yaml_plist
 from plistyamlplist_lib.json_plist import json_plist
 from plistyamlplist_lib.yaml_tidy import tidy_yaml
+from plistyamlplist_lib import archive
+from plistyamlplist_lib import compact
+from plistyamlplist_lib import compression
+from plistyamlplist_lib import git_changes
+from plistyamlplist_lib import shard
+from plistyamlplist_lib import key_order
+from plistyamlplist_lib import memory
+from plistyamlplist_lib import multi_emit
 from plistyamlplist_lib.version import __version__
 
-
 VERSION = __version__
 
+# the input and output formats of each folder conversion job
+JOB_FORMATS = {
+    "yaml_plist": ("yaml", "plist"),
+    "json_plist": ("json", "plist"),
+    "plist_yaml": ("plist", "yaml"),
+    "tidy": ("yaml", "yaml"),
+}
+
 
 def usage():
     """print help."""
@@ -53,14 +70,84 @@ def usage():
         "the corresponding subfolder structure under the <output> folder."
     )
     print("If <output> is --tidy,\n" "<input>.yaml is tidied up for AutoPkg.\n")
+    print(
+        "If --changed-since <ref> is given when <input> is a folder,\n"
+        "only the files added, modified, renamed or deleted since the git\n"
+        "ref <ref> are converted, and the outputs of deleted files removed.\n"
+    )
+    print(
+        "If --shard i/N is given when <input> is a folder or an archive, only\n"
+        "the i-th of N deterministic shares of the files is converted, and a\n"
+        "manifest is written to --shard-manifest <path> (default: the current\n"
+        "folder).\n"
+    )
+    print(
+        "If --key-order <profile> is given, the keys of YAML output are ordered\n"
+        "by the profile: autopkg, munki, profile, or a JSON or YAML file.\n"
+        "AutoPkg recipes are ordered by the autopkg profile by default.\n"
+    )
+    print(
+        "If --emit <formats> is given, <input> is parsed once and written in\n"
+        "each of the comma-separated formats yaml, plist and json, named after\n"
+        "the plist output. YAML input is tidied in place if yaml is listed.\n"
+    )
+    print(
+        "Files ending in .gz, .xz or .bz2 are read and written compressed,\n"
+        "and outputs keep the compression of their input. --compress\n"
+        "<codec>[:<level>] sets the codec of outputs: gz, xz, bz2 or none.\n"
+    )
+    print(
+        "<input> and <output> can also be tar or zip archives with 'YAML',\n"
+        "'JSON' or 'PLIST' in the <input> path, and are then converted as if\n"
+        "<output> were a folder, without extracting the files to disk.\n"
+    )
+    print(
+        "If --stream is given, YAML and JSON files are converted to PLIST while\n"
+        "they are read, keeping dictionary keys in their original order.\n"
+    )
+    print(
+        "With --max-memory <size>, such as 512M or 2G, files in a folder, glob\n"
+        "or archive that are estimated to need more memory than <size> are\n"
+        "streamed if converting to PLIST, and skipped otherwise.\n"
+        "--memory-report prints the peak memory used by each file at the end.\n"
+    )
+    print(
+        "If --compact is given, repeated keys, values and subtrees are shared\n"
+        "as each file is loaded, to hold large catalogs in less memory.\n"
+    )
+
+
+def pop_flag(name):
+    """remove a flag from the command line arguments, returning whether it
+    was given."""
+    if name not in sys.argv:
+        return False
+    sys.argv.remove(name)
+    return True
+
+
+def pop_option(name):
+    """remove an option and its value from the command line arguments,
+    returning the value, or None if the option was not given."""
+    if name not in sys.argv:
+        return None
+    index = sys.argv.index(name)
+    try:
+        value = sys.argv[index + 1]
+    except IndexError:
+        print("ERROR: {} requires a value\n".format(name))
+        usage()
+        exit(1)
+    del sys.argv[index : index + 2]
+    return value
 
 
 def check_if_plist(in_path):
     """rather than restrict by filename, check if the file is a plist by
     reading the second line of the file for the PLIST declaration."""
     is_plist = False
-    with open(in_path) as fp:
-        try:
+    try:
+        with compression.open_file(in_path, "r") as fp:
             for i, line in enumerate(fp):
                 if i == 1:
                     # print line
@@ -68,8 +155,9 @@ def check_if_plist(in_path):
                         is_plist = True
                 elif i > 2:
                     break
-        except UnicodeDecodeError:
-            pass
+    except (UnicodeDecodeError, OSError, EOFError, lzma.LZMAError):
+        # not text, or not valid for the codec of its suffix
+        pass
     return is_plist
 
 
@@ -116,7 +204,10 @@ def check_for_json_folder(check_path):
 
 
 def get_out_path(in_path, filetype):
-    """determine the out_path when none given"""
+    """determine the out_path when none given. A compression suffix on
+    in_path is moved to the end of out_path."""
+    compressed_path = in_path
+    in_path, suffix = compression.split_suffix(in_path)
     if filetype == "yaml":
         out_dir = check_for_yaml_folder(in_path)
         if out_dir:
@@ -134,13 +225,450 @@ def get_out_path(in_path, filetype):
             filename, _ = os.path.splitext(os.path.abspath(in_path))
             out_path = filename
     else:
-        if check_if_plist(in_path):
+        if check_if_plist(compressed_path):
             out_path = in_path + ".yaml"
         else:
             print("\nERROR: File is not PLIST, JSON or YAML format.\n")
             usage()
             exit(1)
-    return out_path
+    return out_path + compression.output_suffix(suffix)
+
+
+def get_converted_name(path, filetype):
+    """name the file a YAML, JSON or PLIST file is converted to, swapping
+    .yaml for .plist, removing .json, or swapping .plist for .yaml, and
+    moving any compression suffix to the end."""
+    plain_path, suffix = compression.split_suffix(path)
+    suffix = compression.output_suffix(suffix)
+    if filetype == "plist":
+        return re.sub(".plist", "", plain_path) + ".yaml" + suffix
+    filename, _ = os.path.splitext(plain_path)
+    if filetype == "yaml":
+        filename += ".plist"
+    return filename + suffix
+
+
+def get_folder_job(source_path, in_path, out_path_base, filetype, tidy=False):
+    """determine what to do with a file in a folder conversion.
+    Returns an (action, source_path, dest_path) tuple."""
+    if tidy:
+        return ("tidy", source_path, source_path)
+    if not out_path_base:
+        return (filetype + "_plist", source_path, get_out_path(source_path, filetype))
+    sub_path = re.sub(in_path, "", source_path)
+    if filetype == "yaml":
+        dest_path = os.path.join(out_path_base, sub_path)
+        if compression.split_suffix(sub_path)[0].endswith(".yaml"):
+            return ("yaml_plist", source_path, get_converted_name(dest_path, "yaml"))
+        return ("copy", source_path, dest_path)
+    dest_path = out_path_base + sub_path
+    if check_if_plist(source_path):
+        return ("plist_yaml", source_path, get_converted_name(dest_path, "plist"))
+    return ("copy", source_path, dest_path)
+
+
+def get_possible_outputs(source_path, in_path, out_path_base, filetype, formats=None):
+    """list every destination a file in a folder could be converted or copied
+    to, including those of --emit, without reading the file."""
+    if not out_path_base:
+        converted_paths = [get_out_path(source_path, filetype)]
+        copied_paths = []
+    else:
+        sub_path = re.sub(in_path, "", source_path)
+        if filetype == "yaml":
+            dest_path = os.path.join(out_path_base, sub_path)
+            if compression.split_suffix(sub_path)[0].endswith(".yaml"):
+                converted_paths = [get_converted_name(dest_path, filetype)]
+                copied_paths = []
+            else:
+                converted_paths = []
+                copied_paths = [dest_path]
+        else:
+            # whether a plist was converted or copied depends on its contents
+            dest_path = out_path_base + sub_path
+            converted_paths = [get_converted_name(dest_path, filetype)]
+            copied_paths = [dest_path]
+    if formats and converted_paths:
+        base_path = multi_emit.plist_base(converted_paths[0], filetype)
+        converted_paths.extend(
+            multi_emit.derived_path(base_path, fmt)
+            for fmt in formats
+            if fmt != filetype or (fmt == "yaml" and out_path_base)
+        )
+    return converted_paths + copied_paths
+
+
+def get_removed_jobs(
+    source_path, in_path, out_path_base, filetype, tidy=False, formats=None
+):
+    """determine which outputs to remove for a file deleted from a folder.
+    As the source no longer exists, every destination it could have been
+    converted or copied to is considered, except those that another file in
+    the same folder can also be written to."""
+    if tidy:
+        return []
+    dest_paths = get_possible_outputs(
+        source_path, in_path, out_path_base, filetype, formats
+    )
+    if out_path_base:
+        source_dir = os.path.dirname(source_path)
+        kept_paths = set()
+        if os.path.isdir(source_dir):
+            for name in os.listdir(source_dir):
+                other_path = os.path.join(source_dir, name)
+                if os.path.isfile(other_path):
+                    kept_paths.update(
+                        get_possible_outputs(
+                            other_path, in_path, out_path_base, filetype, formats
+                        )
+                    )
+        dest_paths = [path for path in dest_paths if path not in kept_paths]
+    return [("remove", source_path, dest_path) for dest_path in dest_paths]
+
+
+def in_folder_scope(source_path, in_path, out_path_base, tidy=False):
+    """check whether a file would be picked up by a full run of the folder.
+    Folders converted in place are not walked recursively, and YAML folders
+    within a PLIST folder are skipped."""
+    if not tidy and not out_path_base:
+        return os.path.dirname(os.path.normpath(source_path)) == os.path.normpath(
+            in_path
+        )
+    if out_path_base and "PLIST" in in_path and "YAML" in source_path:
+        # chances are we don't want to copy the contents of a YAML folder here
+        return False
+    return True
+
+
+def walk_folder(in_path, out_path_base, tidy=False):
+    """list the files that a full run of the folder would process."""
+    if not tidy and not out_path_base:
+        return [os.path.join(in_path, in_file) for in_file in os.listdir(in_path)]
+    source_paths = []
+    for root, _, files in os.walk(in_path):
+        for name in files:
+            source_path = os.path.join(root, name)
+            if in_folder_scope(source_path, in_path, out_path_base, tidy):
+                source_paths.append(source_path)
+    return source_paths
+
+
+def get_folder_jobs(
+    in_path, out_path_base, filetype, tidy=False, changed_since=None, formats=None
+):
+    """build the list of jobs for a folder conversion, limited to the files
+    changed since a git ref if one is given."""
+    changes = None
+    if changed_since:
+        changes = git_changes.changed_files(in_path, changed_since)
+        if changes is None:
+            print(
+                "WARNING: could not find git ref {} for {}, "
+                "processing all files\n".format(changed_since, in_path)
+            )
+    if changes is None:
+        source_paths = walk_folder(in_path, out_path_base, tidy)
+        removed_paths = []
+    else:
+        changed_paths, removed_paths = changes
+        source_paths = [
+            source_path
+            for source_path in changed_paths
+            if os.path.isfile(source_path)
+            and in_folder_scope(source_path, in_path, out_path_base, tidy)
+        ]
+        removed_paths = [
+            source_path
+            for source_path in removed_paths
+            if in_folder_scope(source_path, in_path, out_path_base, tidy)
+        ]
+        print(
+            "{} changed and {} removed files since {}\n".format(
+                len(source_paths), len(removed_paths), changed_since
+            )
+        )
+
+    jobs = []
+    for source_path in removed_paths:
+        jobs.extend(
+            get_removed_jobs(
+                source_path, in_path, out_path_base, filetype, tidy, formats
+            )
+        )
+    for source_path in source_paths:
+        jobs.append(get_folder_job(source_path, in_path, out_path_base, filetype, tidy))
+    return jobs
+
+
+def run_job(action, source_path, dest_path, options):
+    """carry out a single folder conversion job."""
+    if action == "remove":
+        if os.path.isfile(dest_path):
+            os.remove(dest_path)
+            print("Removed " + dest_path + "\n")
+        return
+    print("Source path: " + source_path)
+    if action != "copy":
+        in_format, out_format = JOB_FORMATS[action]
+        plan = memory.plan(
+            source_path, in_format, None if options["emit"] else out_format
+        )
+        if plan == "skip":
+            return
+        stream = options["stream"] or plan == "stream"
+        if action == "tidy":
+            with memory.tracked(source_path):
+                tidy_yaml(source_path, profile=options["key_order"])
+            return
+    print("Destination path: " + dest_path)
+    dest_dir = os.path.dirname(dest_path)
+    if dest_dir and not os.path.isdir(dest_dir):
+        print("Creating new folder " + dest_dir)
+        os.makedirs(dest_dir)
+    if action == "copy":
+        try:
+            shutil.copy(source_path, dest_path)
+            if os.path.isfile(dest_path):
+                print("Written to " + dest_path + "\n")
+        except IOError:
+            print("ERROR: could not copy " + source_path + "\n")
+        return
+    converted = None
+    with memory.tracked(source_path, "streamed" if plan == "stream" else ""):
+        if options["emit"]:
+            multi_emit.multi_emit(
+                source_path,
+                in_format,
+                multi_emit.plist_base(dest_path, in_format),
+                options["emit"],
+                options["key_order"],
+                not options["output_folder"],
+            )
+        elif action == "yaml_plist":
+            converted = yaml_plist(source_path, dest_path, stream, plan != "stream")
+        elif action == "json_plist":
+            converted = json_plist(source_path, dest_path, stream, plan != "stream")
+        else:
+            plist_yaml(source_path, dest_path, options["key_order"])
+    # files streamed for being over budget must not be loaded in full
+    if converted is False:
+        memory.skip(source_path)
+
+
+def process_folder(in_path, filetype, options):
+    """convert a YAML, JSON or PLIST folder. If a second argument is given,
+    it is either --tidy or a folder into which the folder structure is
+    replicated, with other file types copied without conversion.
+    options holds the values of the command line options."""
+    try:
+        out_arg = sys.argv[2]
+    except IndexError:
+        out_arg = None
+
+    tidy = False
+    out_path_base = None
+    if filetype == "yaml" and out_arg == "--tidy":
+        print("WARNING! Processing all subfolders...\n")
+        tidy = True
+    elif filetype != "json" and out_arg:
+        if not os.path.isdir(out_arg):
+            print("ERROR: {} is not a folder\n".format(out_arg))
+            exit(1)
+        out_path_base = os.path.abspath(out_arg)
+        print("Writing to {}".format(out_path_base))
+    elif filetype == "plist":
+        print("\nERROR: An output folder is required for a PLIST folder.\n")
+        usage()
+        exit(1)
+
+    # yaml is only tidied in place by --emit when there is no output folder
+    options = dict(options, output_folder=out_path_base)
+    jobs = get_folder_jobs(
+        in_path,
+        out_path_base,
+        filetype,
+        tidy,
+        options["changed_since"],
+        options["emit"],
+    )
+    run_jobs(jobs, in_path, options)
+
+
+def process_glob(in_path, filetype, options):
+    """convert the YAML or JSON files matching a glob, limited to the files
+    changed since a git ref and to a shard in the same way as a folder."""
+    folder, pattern = os.path.split(in_path)
+    folder = folder or "."
+    source_paths = glob.glob(in_path)
+    removed_paths = []
+    if options["changed_since"]:
+        changes = git_changes.changed_files(folder, options["changed_since"])
+        if changes is None:
+            print(
+                "WARNING: could not find git ref {} for {}, "
+                "processing all files\n".format(options["changed_since"], folder)
+            )
+        else:
+            changed_paths = {os.path.normpath(path) for path in changes[0]}
+            source_paths = [
+                source_path
+                for source_path in source_paths
+                if os.path.normpath(source_path) in changed_paths
+            ]
+            removed_paths = [
+                source_path
+                for source_path in changes[1]
+                if os.path.dirname(source_path) == folder
+                and fnmatch(os.path.basename(source_path), pattern)
+            ]
+            print(
+                "{} changed and {} removed files since {}\n".format(
+                    len(source_paths), len(removed_paths), options["changed_since"]
+                )
+            )
+
+    jobs = []
+    for source_path in removed_paths:
+        jobs.extend(
+            get_removed_jobs(
+                source_path, folder, None, filetype, formats=options["emit"]
+            )
+        )
+    for source_path in source_paths:
+        jobs.append(
+            (filetype + "_plist", source_path, get_out_path(source_path, filetype))
+        )
+    # outputs go next to the sources, so yaml is tidied in place by --emit
+    run_jobs(jobs, folder, dict(options, output_folder=None))
+
+
+def run_jobs(jobs, in_path, options):
+    """run the jobs of a folder or glob conversion, limited to a shard if one
+    is given, in which case the shard's manifest is written afterwards."""
+    manifest = None
+    if options["shard"]:
+        index, count = options["shard"]
+        jobs, manifest = shard.select_shard(jobs, in_path, index, count)
+        print(
+            "Shard {} of {}: {} of {} files\n".format(
+                index, count, len(manifest["files"]), manifest["total"]
+            )
+        )
+
+    for job in jobs:
+        run_job(*job, options)
+
+    if manifest:
+        shard.write_manifest(
+            manifest,
+            options["shard_manifest"] or shard.manifest_path(index, count),
+        )
+
+
+def is_plist_data(content):
+    """check if the contents of a file held in memory are a plist, in the
+    same way as check_if_plist."""
+    lines = content.split(b"\n", 2)
+    return len(lines) > 1 and b"PLIST 1.0" in lines[1]
+
+
+def process_archive(in_path, filetype, options):
+    """convert the files of a tar or zip archive into an output archive or
+    folder, or the files of a folder into an output archive, applying the
+    same naming rules as a folder replicated into another folder. Files are
+    read, converted and written one at a time."""
+    try:
+        out_path = sys.argv[2]
+    except IndexError:
+        print("\nERROR: An output archive or folder is required.\n")
+        usage()
+        exit(1)
+    if out_path == "--tidy":
+        print("\nERROR: Archives cannot be tidied in place.\n")
+        exit(1)
+    if not archive.is_archive(out_path) and not os.path.isdir(out_path):
+        print("ERROR: {} is not a folder\n".format(out_path))
+        exit(1)
+    if options["changed_since"]:
+        print("WARNING: --changed-since is ignored for archives\n")
+
+    def in_scope(name):
+        # chances are we don't want to copy the contents of a YAML folder here
+        return not (filetype == "plist" and "YAML" in name)
+
+    manifest = None
+    selected = None
+    if options["shard"]:
+        index, count = options["shard"]
+        if os.path.isdir(in_path):
+            sizes = archive.folder_sizes(
+                in_path, lambda path: in_folder_scope(path, in_path, out_path)
+            )
+        else:
+            sizes = archive.member_sizes(in_path)
+        sizes = {name: size for name, size in sizes.items() if in_scope(name)}
+        selected, manifest = shard.select_names(sizes, index, count)
+        print(
+            "Shard {} of {}: {} of {} files\n".format(
+                index, count, len(manifest["files"]), manifest["total"]
+            )
+        )
+
+    def include(name):
+        return in_scope(name) and (selected is None or name in selected)
+
+    if os.path.isdir(in_path):
+        members = archive.read_folder(
+            in_path,
+            lambda path: in_folder_scope(path, in_path, out_path)
+            and include(os.path.relpath(path, in_path)),
+        )
+    else:
+        members = archive.read_members(in_path, include)
+
+    print("Writing to {}".format(out_path))
+    # an output archive is only put in place if every member is written
+    with archive.ArchiveWriter(out_path) as writer:
+        for name, content in members:
+            plain_name, _ = compression.split_suffix(name)
+            data = compression.decompress(content, name)
+            if filetype == "plist":
+                is_source = is_plist_data(data)
+            else:
+                is_source = plain_name.endswith("." + filetype)
+            if not is_source:
+                writer.write(name, content)
+                continue
+
+            source_name = "{}:{}".format(in_path, name)
+            print("Source path: " + source_name)
+            formats = options["emit"] or ["yaml" if filetype == "plist" else "plist"]
+            out_format = None if len(formats) > 1 else formats[0]
+            if memory.plan(source_name, filetype, out_format, len(data)) == "skip":
+                continue
+            with memory.tracked(source_name):
+                try:
+                    parsed = multi_emit.loads(data, filetype, source_name)
+                except Exception as e:
+                    print("ERROR: could not read {}: {}\n".format(name, e))
+                    continue
+                base_name = multi_emit.plist_base(
+                    get_converted_name(name, filetype), filetype
+                )
+                for fmt, out_name in multi_emit.output_paths(
+                    name, filetype, base_name, formats
+                ):
+                    output = multi_emit.render(parsed, fmt, name, options["key_order"])
+                    writer.write(
+                        out_name,
+                        compression.compress(output.encode("utf-8"), out_name),
+                    )
+
+    if manifest:
+        shard.write_manifest(
+            manifest,
+            options["shard_manifest"] or shard.manifest_path(index, count),
+        )
 
 
 def main():
@@ -148,35 +676,74 @@ def main():
 
     print(f"plist-yaml-plist version {VERSION}")
 
+    options = {
+        "changed_since": pop_option("--changed-since"),
+        "shard": pop_option("--shard"),
+        "shard_manifest": pop_option("--shard-manifest"),
+        "key_order": pop_option("--key-order"),
+        "emit": pop_option("--emit"),
+        "compress": pop_option("--compress"),
+        "stream": pop_flag("--stream"),
+        "max_memory": pop_option("--max-memory"),
+        "memory_report": pop_flag("--memory-report"),
+        "compact": pop_flag("--compact"),
+    }
+    if options["max_memory"]:
+        options["max_memory"] = memory.parse_size(options["max_memory"])
+        if not options["max_memory"]:
+            print("\nERROR: --max-memory must be a size such as 512M or 2G.\n")
+            usage()
+            exit(1)
+        memory.set_max_memory(options["max_memory"])
+    memory.set_tracking(options["memory_report"])
+    compact.set_enabled(options["compact"])
+    if options["compress"]:
+        options["compress"] = compression.parse_codec(options["compress"])
+        if not options["compress"]:
+            print("\nERROR: --compress must be gz, xz, bz2 or none, and a level.\n")
+            usage()
+            exit(1)
+        compression.set_output_codec(*options["compress"])
+    if options["emit"]:
+        options["emit"] = multi_emit.parse_formats(options["emit"])
+        if not options["emit"]:
+            print("\nERROR: --emit must be a list of yaml, plist and json.\n")
+            usage()
+            exit(1)
+    if options["key_order"]:
+        options["key_order"] = key_order.load_profile(options["key_order"])
+        if not options["key_order"]:
+            exit(1)
+    if options["shard"]:
+        options["shard"] = shard.parse_shard(options["shard"])
+        if not options["shard"]:
+            print("\nERROR: --shard must be given as i/N, with i from 1 to N.\n")
+            usage()
+            exit(1)
+
     if len(sys.argv) < 2:
         usage()
         exit(1)
 
     in_path = sys.argv[1]
+    plain_path, _ = compression.split_suffix(in_path)
 
     # auto-determine which direction the conversion should go
-    if in_path.endswith(".yaml") or in_path.endswith(".yaml"):
+    if plain_path.endswith(".yaml") or plain_path.endswith(".yaml"):
         filetype = "yaml"
-    elif in_path.endswith(".json"):
+    elif plain_path.endswith(".json"):
         filetype = "json"
-    elif in_path.endswith(".plist"):
+    elif plain_path.endswith(".plist"):
         filetype = "plist"
     else:
         filetype = "other"
 
     if filetype == "yaml" or filetype == "json":
         # allow for converting whole folders if a glob is provided
-        _, glob_files = os.path.split(in_path)
-        if "*" in glob_files:
-            glob_files = glob.glob(in_path)
-            for glob_file in glob_files:
-                out_path = get_out_path(glob_file, filetype)
-                if filetype == "yaml":
-                    print("Processing YAML folder with globs...")
-                    yaml_plist(glob_file, out_path)
-                elif filetype == "json":
-                    print("Processing JSON folder with globs...")
-                    json_plist(glob_file, out_path)
+        _, glob_pattern = os.path.split(in_path)
+        if "*" in glob_pattern:
+            print("Processing {} folder with globs...".format(filetype.upper()))
+            process_glob(in_path, filetype, options)
         else:
             try:
                 sys.argv[2]
@@ -184,121 +751,45 @@ def main():
                 out_path = get_out_path(in_path, filetype)
             else:
                 out_path = sys.argv[2]
-            if filetype == "yaml":
+            if options["emit"] and out_path != "--tidy":
+                print("Processing {} file...".format(filetype))
+                multi_emit.multi_emit(
+                    in_path, filetype, out_path, options["emit"], options["key_order"]
+                )
+            elif filetype == "yaml":
                 print("Processing yaml file...")
                 if out_path == "--tidy":
-                    tidy_yaml(in_path)
+                    tidy_yaml(in_path, profile=options["key_order"])
                 else:
-                    yaml_plist(in_path, out_path)
+                    yaml_plist(in_path, out_path, options["stream"])
             elif filetype == "json":
                 print("Processing json file...")
-                json_plist(in_path, out_path)
+                json_plist(in_path, out_path, options["stream"])
+    # allow for converting archives, or folders into archives, if 'YAML',
+    # 'JSON' or 'PLIST' is in the path
+    elif archive.is_archive(in_path) or (
+        os.path.isdir(in_path) and len(sys.argv) > 2 and archive.is_archive(sys.argv[2])
+    ):
+        for filetype in ("YAML", "JSON", "PLIST"):
+            if filetype in in_path:
+                print("Processing {} archive...".format(filetype))
+                process_archive(in_path, filetype.lower(), options)
+                break
+        else:
+            print("\nERROR: Archive path must contain YAML, JSON or PLIST.\n")
+            usage()
+            exit(1)
     # allow for converting whole folders if 'YAML' or 'JSON' is in the path
     # and the path supplied is a folder
     elif os.path.isdir(in_path) and "YAML" in in_path:
         print("Processing YAML folder...")
-        filetype = "yaml"
-        try:
-            if sys.argv[2] == "--tidy":
-                print("WARNING! Processing all subfolders...\n")
-                for root, dirs, files in os.walk(in_path):
-                    for name in files:
-                        tidy_yaml(os.path.join(root, name))
-                    for name in dirs:
-                        tidy_yaml(os.path.join(root, name))
-            elif os.path.isdir(sys.argv[2]):
-                # allow batch replication of folder structure and conversion of yaml to plist
-                # also copies other file types without conversion to the same place in the
-                # hierarchy
-                out_path_base = os.path.abspath(sys.argv[2])
-                print("Writing to {}".format(out_path_base))
-                for root, dirs, files in os.walk(in_path):
-                    for name in dirs:
-                        working_dir = os.path.join(out_path_base, name)
-                        if not os.path.isdir(working_dir):
-                            print("Creating new folder " + working_dir)
-                            os.mkdir(working_dir)
-                    for name in files:
-                        source_path = os.path.join(root, name)
-                        print("In path: " + in_path)
-                        sub_path = re.sub(in_path, "", source_path)
-                        print("Subdirectory path: " + sub_path)
-                        filename, _ = os.path.splitext(
-                            os.path.join(out_path_base, sub_path)
-                        )
-                        print("Source path: " + source_path)
-                        if source_path.endswith(".yaml"):
-                            dest_path = filename + ".plist"
-                            print("Destination path for plist: " + dest_path)
-                            yaml_plist(source_path, dest_path)
-                        else:
-                            dest_path = os.path.join(
-                                os.path.join(out_path_base, sub_path)
-                            )
-                            print("Destination path: " + dest_path)
-                            try:
-                                shutil.copy(source_path, dest_path)
-                                if os.path.isfile(dest_path):
-                                    print("Written to " + dest_path + "\n")
-                            except IOError:
-                                print("ERROR: could not copy " + source_path + "\n")
-        except IndexError:
-            for in_file in os.listdir(in_path):
-                in_file_path = os.path.join(in_path, in_file)
-                out_path = get_out_path(in_file_path, filetype)
-                yaml_plist(in_file_path, out_path)
+        process_folder(in_path, "yaml", options)
     elif os.path.isdir(in_path) and "JSON" in in_path:
         print("Processing JSON folder...")
-        filetype = "json"
-        for in_file in os.listdir(in_path):
-            in_file_path = os.path.join(in_path, in_file)
-            out_path = get_out_path(in_file_path, filetype)
-            json_plist(in_file_path, out_path)
+        process_folder(in_path, "json", options)
     elif os.path.isdir(in_path) and "PLIST" in in_path:
         print("Processing PLIST folder...")
-        filetype = "plist"
-        if os.path.isdir(sys.argv[2]):
-            # allow batch replication of folder structure and conversion of plist to yaml
-            # also copies other file types without conversion to the same place in the
-            # hierarchy
-            out_path_base = os.path.abspath(sys.argv[2])
-            print("Writing to " + out_path_base)
-            for root, dirs, files in os.walk(in_path):
-                for name in dirs:
-                    source_dir = os.path.join(root, name)
-                    sub_dir = re.sub(in_path, "", source_dir)
-                    working_dir = out_path_base + sub_dir
-                    if "YAML" in working_dir:
-                        # chances are we don't want to copy the contents of a YAML
-                        # folder here
-                        continue
-                    if not os.path.isdir(working_dir):
-                        print("Creating new folder " + working_dir)
-                        os.mkdir(working_dir)
-                for name in files:
-                    source_path = os.path.join(root, name)
-                    if "YAML" in source_path:
-                        # chances are we don't want to copy the contents of a YAML
-                        # folder here
-                        continue
-                    print("In path: " + in_path)
-                    sub_path = re.sub(in_path, "", source_path)
-                    print("Subdirectory path: " + sub_path)
-                    print("Source path: " + source_path)
-                    if check_if_plist(source_path):
-                        filename = re.sub(".plist", "", out_path_base + sub_path)
-                        dest_path = filename + ".yaml"
-                        print("Destination path for yaml: " + dest_path)
-                        plist_yaml(source_path, dest_path)
-                    else:
-                        dest_path = out_path_base + sub_path
-                        print("Destination path: " + dest_path)
-                        try:
-                            shutil.copy(source_path, dest_path)
-                            if os.path.isfile(dest_path):
-                                print("Written to " + dest_path + "\n")
-                        except IOError:
-                            print("ERROR: could not copy " + source_path + "\n")
+        process_folder(in_path, "plist", options)
     else:
         if check_if_plist(in_path):
             try:
@@ -308,12 +799,23 @@ def main():
             else:
                 out_path = sys.argv[2]
             print("Processing plist file...")
-            plist_yaml(in_path, out_path)
+            if options["emit"]:
+                multi_emit.multi_emit(
+                    in_path,
+                    "plist",
+                    multi_emit.plist_base(out_path, "plist"),
+                    options["emit"],
+                    options["key_order"],
+                )
+            else:
+                plist_yaml(in_path, out_path, options["key_order"])
         else:
             print("\nERROR: Input File is not PLIST, JSON or YAML format.\n")
             usage()
             exit(1)
 
+    memory.print_report()
+
 
 if __name__ == "__main__":
     main()
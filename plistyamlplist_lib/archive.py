@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Read the files of a tar or zip archive, or of a folder, one at a time, and
+write converted files straight into a tar or zip archive, or a folder.
+
+Tar archives are read and written as a stream, so only one member is held in
+memory at a time and nothing is extracted to disk. Output archives are
+written under a temporary name, and only put in place once every file has
+been written.
+"""
+
+import io
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+
+try:
+    from . import compression
+except ImportError:  # run directly as a script
+    import compression
+
+TAR_SUFFIXES = {
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.xz": "xz",
+    ".txz": "xz",
+    ".tar.bz2": "bz2",
+    ".tbz2": "bz2",
+}
+
+
+def is_archive(path):
+    """Check whether a path names a tar or zip archive."""
+    return path.endswith(".zip") or path.endswith(tuple(TAR_SUFFIXES))
+
+
+def tar_codec(path):
+    """Return the compression of a tar archive from its suffix."""
+    for suffix, codec in TAR_SUFFIXES.items():
+        if path.endswith(suffix):
+            return codec
+    return ""
+
+
+def member_sizes(path):
+    """Return the size of each regular file in an archive by name, without
+    reading the files. Tar archives are read through once to find them."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "r") as zf:
+            return {
+                info.filename: info.file_size
+                for info in zf.infolist()
+                if not info.is_dir()
+            }
+    with tarfile.open(path, "r|*") as tf:
+        return {member.name: member.size for member in tf if member.isfile()}
+
+
+def folder_sizes(path, include=None):
+    """Return the size of each file in a folder by name relative to the
+    folder, as read_folder names them. include is as for read_folder."""
+    sizes = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            source_path = os.path.join(root, name)
+            if include and not include(source_path):
+                continue
+            sizes[os.path.relpath(source_path, path)] = os.path.getsize(source_path)
+    return sizes
+
+
+def read_members(path, include=None):
+    """Yield (name, contents) for each regular file in an archive, in archive
+    order, reading one member at a time. include, if given, is called with
+    the name of each file to decide whether to read it."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "r") as zf:
+            for info in zf.infolist():
+                if info.is_dir() or (include and not include(info.filename)):
+                    continue
+                yield info.filename, zf.read(info)
+        return
+    with tarfile.open(path, "r|*") as tf:
+        for member in tf:
+            if member.isfile() and (not include or include(member.name)):
+                yield member.name, tf.extractfile(member).read()
+
+
+def read_folder(path, include=None):
+    """Yield (name, contents) for each file in a folder, named relative to the
+    folder, reading one file at a time. include, if given, is called with
+    the path of each file to decide whether to read it."""
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            source_path = os.path.join(root, name)
+            if include and not include(source_path):
+                continue
+            with open(source_path, "rb") as fp:
+                yield os.path.relpath(source_path, path), fp.read()
+
+
+class ArchiveWriter(object):
+    """Write files into a new tar or zip archive, or into a folder if the path
+    is not an archive. An archive is written under a temporary name, and
+    replaces path when the writer is closed, unless closed after an error.
+    Files written into a folder are each replaced once written in full."""
+
+    def __init__(self, path):
+        self.path = path
+        self.zf = None
+        self.tf = None
+        self.replacing = None
+        if is_archive(path):
+            self.replacing = compression.open_replacing(path, "wb", compress=False)
+            fp = self.replacing.__enter__()
+            if path.endswith(".zip"):
+                self.zf = zipfile.ZipFile(fp, "w", zipfile.ZIP_DEFLATED)
+            else:
+                self.tf = tarfile.open(fileobj=fp, mode="w|" + tar_codec(path))
+
+    def write(self, name, data):
+        """Add a file with the given name and contents."""
+        name = posixpath.normpath(name.replace(os.sep, "/")).lstrip("/")
+        if name == ".." or name.startswith("../"):
+            print("ERROR: not writing {} outside {}".format(name, self.path))
+            return
+        if self.zf:
+            self.zf.writestr(name, data)
+        elif self.tf:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.tf.addfile(info, io.BytesIO(data))
+        else:
+            out_path = os.path.join(self.path, name)
+            if not os.path.isdir(os.path.dirname(out_path)):
+                os.makedirs(os.path.dirname(out_path))
+            with compression.open_replacing(out_path, "wb", compress=False) as fp:
+                fp.write(data)
+        print("Written to {}:{}".format(self.path, name))
+
+    def close(self, *exc_info):
+        """Finish the archive and put it in place. If exc_info is given, the
+        run failed, and the archive is removed instead."""
+        if self.zf:
+            self.zf.close()
+        elif self.tf:
+            self.tf.close()
+        if self.replacing:
+            replacing, self.replacing = self.replacing, None
+            replacing.__exit__(*(exc_info or (None, None, None)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close(*exc_info)
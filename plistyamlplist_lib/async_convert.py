@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Convert files from asyncio code without blocking the event loop.
+
+Files are read and written in the event loop's default thread pool, and the
+parsing and rendering is done in the executor given, which may be a
+ThreadPoolExecutor or, to convert several files in parallel, a
+ProcessPoolExecutor. Nothing is printed; results and errors are returned.
+
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    from plistyamlplist_lib.async_convert import convert_file, convert_many
+
+    async def render():
+        await convert_file("com.something.plist.yaml")
+        with ProcessPoolExecutor() as executor:
+            await convert_many(yaml_paths, executor=executor, limit=16)
+"""
+
+import asyncio
+import os
+
+from . import compression
+from . import multi_emit
+
+# the format each input format is converted to by default
+OUTPUT_FORMATS = {"yaml": "plist", "json": "plist", "plist": "yaml"}
+
+
+def detect_format(in_path):
+    """Return the format of a file from its name: yaml, json or plist."""
+    plain_path, _ = compression.split_suffix(in_path)
+    if plain_path.endswith(".yaml"):
+        return "yaml"
+    if plain_path.endswith(".json"):
+        return "json"
+    return "plist"
+
+
+def default_out_path(in_path, in_format, out_format):
+    """Name the output file in the same way as the command line tools."""
+    plain_path, suffix = compression.split_suffix(in_path)
+    if in_format != "plist":
+        plain_path, _ = os.path.splitext(plain_path)
+    base_path = plain_path + compression.output_suffix(suffix)
+    return multi_emit.derived_path(base_path, out_format)
+
+
+def read_file(in_path):
+    """Read a file, decompressing it if needed."""
+    with compression.open_file(in_path, "rb") as fp:
+        return fp.read()
+
+
+def write_file(out_path, content):
+    """Write a file, compressing it if needed. The file is written under a
+    temporary name first, so that a cancelled or failed conversion never
+    leaves a partly written file behind, and keeps the permissions of any
+    file it replaces."""
+    with compression.open_replacing(out_path, "wb") as fp:
+        fp.write(content)
+
+
+def convert_data(content, in_format, out_format, name, profile=None):
+    """Convert the contents of a file from one format to another. This is the
+    CPU-bound part of a conversion, and can be run in a process pool."""
+    data = multi_emit.loads(content, in_format)
+    return multi_emit.render(data, out_format, name, profile).encode("utf-8")
+
+
+async def convert_file(
+    in_path, out_path=None, out_format=None, executor=None, profile=None
+):
+    """Convert a file, returning the path written to.
+
+    The output format defaults to plist for yaml and json files, and yaml for
+    plist files, and out_path to the name the command line tools would use.
+    profile is a key order profile for yaml output.
+    """
+    loop = asyncio.get_running_loop()
+    in_format = detect_format(in_path)
+    out_format = out_format or OUTPUT_FORMATS[in_format]
+    if out_path is None:
+        out_path = default_out_path(in_path, in_format, out_format)
+
+    content = await loop.run_in_executor(None, read_file, in_path)
+    output = await loop.run_in_executor(
+        executor, convert_data, content, in_format, out_format, in_path, profile
+    )
+    await loop.run_in_executor(None, write_file, out_path, output)
+    return out_path
+
+
+async def convert_many(
+    in_paths,
+    out_format=None,
+    executor=None,
+    profile=None,
+    limit=None,
+    return_exceptions=False,
+):
+    """Convert many files, returning the paths written to in input order.
+
+    in_paths may be any iterable, including a generator, of input paths or
+    (in_path, out_path) pairs. It is consumed lazily, with at most limit
+    conversions in progress at once (by default the number of CPUs), so a
+    long list of files does not build up a backlog of waiting tasks.
+
+    If a conversion fails, the others are cancelled and the error is raised,
+    unless return_exceptions is set, in which case the error is returned in
+    place of its path. Cancelling convert_many cancels every conversion in
+    progress.
+    """
+    if limit is None:
+        limit = os.cpu_count() or 1
+    results = {}
+    indexes = {}
+    pending = set()
+
+    def collect(done):
+        for task in done:
+            if task.exception() is not None and not return_exceptions:
+                raise task.exception()
+            results[indexes.pop(task)] = task.exception() or task.result()
+
+    count = 0
+    try:
+        for item in in_paths:
+            if len(pending) >= limit:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                collect(done)
+            if isinstance(item, tuple):
+                in_path, out_path = item
+            else:
+                in_path, out_path = item, None
+            task = asyncio.ensure_future(
+                convert_file(in_path, out_path, out_format, executor, profile)
+            )
+            indexes[task] = count
+            pending.add(task)
+            count += 1
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            collect(done)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+    return [results[index] for index in range(count)]
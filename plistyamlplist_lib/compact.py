@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Hold large files compactly in memory as they are loaded.
+
+Munki catalogs and similar files repeat the same dictionary keys, and many of
+the same values, across thousands of entries, and each occurrence is loaded as
+a separate object. When compact loading is enabled, equal keys and values are
+made the same object while the file is parsed, where the parser allows it, and
+dictionaries and lists with the same contents in the same order are shared.
+The data is unchanged, so the output is too, as long as YAML is written
+without anchors and aliases for the shared objects.
+"""
+
+import json
+import math
+import subprocess
+import sys
+from itertools import chain
+
+try:
+    from . import memory
+except ImportError:  # run directly as a script
+    import memory
+
+try:
+    from ruamel.yaml import load as load_yaml_with
+    from ruamel.yaml import safe_load
+    from ruamel.yaml.loader import SafeLoader
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "ensurepip", "--user"])
+    subprocess.check_call(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "-U",
+            "pip",
+            "setuptools",
+            "wheel",
+            "ruamel.yaml<0.18.0",
+            "--user",
+        ]
+    )
+    from ruamel.yaml import load as load_yaml_with
+    from ruamel.yaml import safe_load
+    from ruamel.yaml.loader import SafeLoader
+
+# whether files are compacted once they are loaded
+settings = {"enabled": False}
+
+
+def set_enabled(enabled):
+    """Turn compact loading on or off."""
+    settings["enabled"] = enabled
+
+
+def deep_size(data):
+    """Return the memory in bytes of the objects in data, counting each
+    object once however many times it appears."""
+    seen = set()
+    size = 0
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        size += sys.getsizeof(node)
+        if isinstance(node, dict):
+            stack.extend(node.keys())
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return size
+
+
+class Compactor(object):
+    """Intern the keys and values of one file, and share its dictionaries and
+    lists, as they are parsed or once the file is loaded. Tracks the memory
+    freed by doing so."""
+
+    def __init__(self, share=True):
+        self.share = share
+        self.saved = 0
+        # interned values by type, so that 1, 1.0 and True are kept apart
+        self.values = {}
+        # dictionaries and lists by a hash of the ids of their contents
+        self.shared = {}
+
+    def intern(self, value):
+        """Return the first value seen equal to value and of the same type."""
+        key = value
+        if isinstance(value, float) and value == 0:
+            # -0.0 == 0.0, but they are written differently
+            key = (value, math.copysign(1.0, value))
+        try:
+            found = self.values.setdefault(type(value), {}).setdefault(key, value)
+        except TypeError:
+            return value
+        if found is not value:
+            self.saved += sys.getsizeof(value)
+        return found
+
+    def share_node(self, node):
+        """Return the first dictionary or list seen with the same contents as
+        node, whose contents must already be interned or shared, so that they
+        are kept alive and their ids cannot be reused. Only a hash is kept for
+        each node, and a node whose hash is taken by another is not shared."""
+        if not self.share:
+            return node
+        if isinstance(node, dict):
+            items = tuple(map(id, chain.from_iterable(node.items())))
+        else:
+            items = tuple(map(id, node))
+        key = hash((type(node), items))
+        found = self.shared.setdefault(key, node)
+        if found is node:
+            return node
+        if type(found) is type(node) and len(found) == len(node):
+            if isinstance(node, dict):
+                pairs = zip(
+                    chain.from_iterable(found.items()),
+                    chain.from_iterable(node.items()),
+                )
+            else:
+                pairs = zip(found, node)
+            if all(a is b for a, b in pairs):
+                self.saved += sys.getsizeof(node)
+                return found
+        return node
+
+    def compact(self, node):
+        """Compact loaded data, compacting dictionaries and lists in place so
+        that the objects replaced are freed as it goes."""
+        if isinstance(node, dict):
+            items = [
+                (self.intern(key), self.compact(value)) for key, value in node.items()
+            ]
+            node.clear()
+            node.update(items)
+        elif isinstance(node, list):
+            for index, item in enumerate(node):
+                node[index] = self.compact(item)
+        else:
+            return self.intern(node)
+        return self.share_node(node)
+
+    def json_object(self, pairs):
+        """Build a JSON object from its parsed keys and values, dropping None
+        values. Used as the object_pairs_hook, so the objects it contains have
+        already been built, but lists have not been compacted."""
+        return self.share_node(
+            {
+                self.intern(key): self.json_value(value)
+                for key, value in pairs
+                if value is not None
+            }
+        )
+
+    def json_value(self, value):
+        """Compact a value within a JSON object, or the whole document."""
+        if isinstance(value, list):
+            value[:] = [self.json_value(item) for item in value if item is not None]
+            return self.share_node(value)
+        if isinstance(value, dict):
+            return value
+        return self.intern(value)
+
+
+def compact(data, share=True):
+    """Return data with equal keys and values interned, and, if share is set,
+    equal dictionaries and lists shared."""
+    return Compactor(share).compact(data)
+
+
+def report(compactor, in_path):
+    """Print the memory saved by compact loading a file."""
+    print(
+        "Compact loading of {} saved {}".format(
+            in_path, memory.format_size(compactor.saved)
+        )
+    )
+
+
+def load(data, in_path, share=True):
+    """Compact freshly loaded data if compact loading is enabled, reporting
+    the memory saved. Set share to False for YAML that is written back out as
+    YAML, so that only its own anchors and aliases are written."""
+    if not settings["enabled"]:
+        return data
+    compactor = Compactor(share)
+    data = compactor.compact(data)
+    report(compactor, in_path)
+    return data
+
+
+def load_json(source, in_path):
+    """Parse JSON from a file or a string with None values dropped, interning
+    and sharing as it is parsed, so that clean_nones is not needed afterwards,
+    and report the memory saved."""
+    compactor = Compactor()
+    parse = json.loads if isinstance(source, (str, bytes)) else json.load
+    data = compactor.json_value(parse(source, object_pairs_hook=compactor.json_object))
+    report(compactor, in_path)
+    return data
+
+
+class CompactLoader(SafeLoader):
+    """SafeLoader which interns each key and value it constructs with its
+    compactor, which is set by loader_for."""
+
+    compactor = None
+
+    def construct_non_recursive_object(self, node, tag=None):
+        data = SafeLoader.construct_non_recursive_object(self, node, tag)
+        if isinstance(data, (dict, list)):
+            # filled in after they are returned, and shared once loaded
+            return data
+        return self.compactor.intern(data)
+
+
+def loader_for(compactor):
+    """Return a Loader class which interns with the given compactor."""
+    return type("CompactLoader", (CompactLoader,), {"compactor": compactor})
+
+
+def load_yaml(source, in_path, share=True):
+    """Parse YAML from a file or a string. If compact loading is enabled, keys
+    and values are interned as they are constructed, then dictionaries and
+    lists are shared if share is set, and the memory saved is reported."""
+    if not settings["enabled"]:
+        return safe_load(source)
+    compactor = Compactor(share)
+    data = load_yaml_with(source, Loader=loader_for(compactor))
+    if share:
+        data = compactor.compact(data)
+    report(compactor, in_path)
+    return data
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Read and write gzip, xz and bzip2 compressed files transparently.
+
+Compressed input is recognised by its .gz, .xz or .bz2 suffix, or failing
+that by its magic bytes, and is decompressed while it is read. Output is
+compressed if its path has one of these suffixes. Output paths worked out from
+an input path keep the input's compression suffix, unless another codec has
+been configured with set_output_codec.
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import secrets
+import stat
+from contextlib import contextmanager
+
+SUFFIXES = {".gz": "gz", ".xz": "xz", ".bz2": "bz2"}
+
+MAGIC = {b"\x1f\x8b": "gz", b"\xfd7zXZ\x00": "xz", b"BZh": "bz2"}
+
+# the codec and level used for output paths worked out from input paths;
+# a codec of None keeps the input's codec, and "none" writes uncompressed
+settings = {"codec": None, "level": None}
+
+
+def parse_codec(value):
+    """Parse a codec[:level] specification, such as gz, xz:9 or none.
+    Returns (codec, level) or None if the value is not valid."""
+    codec, _, level = value.partition(":")
+    if codec not in list(SUFFIXES.values()) + ["none"]:
+        return None
+    if not level:
+        return codec, None
+    try:
+        level = int(level)
+    except ValueError:
+        return None
+    if not 0 <= level <= 9 or (codec == "bz2" and level == 0):
+        return None
+    return codec, level
+
+
+def set_output_codec(codec, level=None):
+    """Set the codec and level of output paths worked out from input paths."""
+    settings["codec"] = codec
+    settings["level"] = level
+
+
+def split_suffix(path):
+    """Split a path into the path without its compression suffix, and the
+    suffix, which is empty if the path has none."""
+    for suffix in SUFFIXES:
+        if path.endswith(suffix):
+            return path[: -len(suffix)], suffix
+    return path, ""
+
+
+def output_suffix(in_suffix):
+    """Return the compression suffix for an output path worked out from an
+    input path with the given suffix."""
+    if settings["codec"] == "none":
+        return ""
+    if settings["codec"]:
+        return "." + settings["codec"]
+    return in_suffix
+
+
+def detect_codec(path):
+    """Return the codec of a file from its suffix or magic bytes, or None if
+    it is not compressed."""
+    _, suffix = split_suffix(path)
+    if suffix:
+        return SUFFIXES[suffix]
+    try:
+        with open(path, "rb") as fp:
+            head = fp.read(6)
+    except IOError:
+        return None
+    for magic, codec in MAGIC.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def open_file(path, mode="r"):
+    """Open a file for reading or writing, streaming it through its codec if
+    it is compressed. Works like open for uncompressed files."""
+    if "r" in mode:
+        codec = detect_codec(path)
+    else:
+        codec = SUFFIXES.get(split_suffix(path)[1])
+    if not codec:
+        return open(path, mode)
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+    level = settings["level"]
+    if codec == "gz":
+        return gzip.open(path, mode, compresslevel=9 if level is None else level)
+    if codec == "bz2":
+        return bz2.open(path, mode, compresslevel=9 if level is None else level)
+    if "r" in mode:
+        return lzma.open(path, mode)
+    return lzma.open(path, mode, preset=level)
+
+
+@contextmanager
+def open_replacing(path, mode="w", compress=True):
+    """Open a temporary file next to path for writing through the codec of
+    path, and replace path with it once it has been written. If writing
+    fails, the temporary file is removed and path is left as it was. The new
+    file keeps the permissions of the file it replaces, or gets the usual
+    permissions of a new file. Set compress to False to write the file as
+    is, for data that is already compressed."""
+    folder, name = os.path.split(os.path.abspath(path))
+    suffix = split_suffix(path)[1]
+    while True:
+        tmp_path = os.path.join(
+            folder, ".{}.{}{}".format(name, secrets.token_hex(4), suffix)
+        )
+        try:
+            # created like open does, so that the umask applies
+            os.close(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+            break
+        except FileExistsError:
+            continue
+    try:
+        if os.path.exists(path):
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        with open_file(tmp_path, mode) if compress else open(tmp_path, mode) as fp:
+            yield fp
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def decompress(data, path):
+    """Decompress the contents of a file held in memory, such as an archive
+    member, using the codec given by its path."""
+    codec = SUFFIXES.get(split_suffix(path)[1])
+    if codec == "gz":
+        return gzip.decompress(data)
+    if codec == "bz2":
+        return bz2.decompress(data)
+    if codec == "xz":
+        return lzma.decompress(data)
+    return data
+
+
+def compress(data, path):
+    """Compress the contents of a file held in memory using the codec given by
+    its path, and the configured level."""
+    codec = SUFFIXES.get(split_suffix(path)[1])
+    level = settings["level"]
+    if codec == "gz":
+        return gzip.compress(data, compresslevel=9 if level is None else level)
+    if codec == "bz2":
+        return bz2.compress(data, compresslevel=9 if level is None else level)
+    if codec == "xz":
+        return lzma.compress(data, preset=level)
+    return data
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Ask the local git repository which files have changed since a given ref, so
+that folder conversions can be limited to the files that actually need it."""
+
+import os.path
+import subprocess
+
+
+def run_git(folder, *args):
+    """Run a git command in the given folder, returning its output or None if
+    git is unavailable or the command fails."""
+    try:
+        result = subprocess.run(
+            ["git", "-C", folder] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode("utf-8")
+
+
+def changed_files(folder, ref):
+    """Return the files under folder that were added, modified, renamed or
+    deleted since ref, as two lists of paths joined onto folder:
+    (changed, removed).
+
+    Uncommitted changes and untracked files are included. Renames are treated
+    as the removal of the old path and the addition of the new one.
+    Returns None if folder is not in a git repository or ref cannot be found.
+    """
+    if run_git(folder, "rev-parse", "--verify", "--quiet", ref + "^{commit}") is None:
+        return None
+
+    # --relative limits the diff to the folder and gives paths relative to it
+    diff = run_git(folder, "diff", "--name-status", "-M", "--relative", "-z", ref, "--")
+    untracked = run_git(folder, "ls-files", "--others", "--exclude-standard", "-z")
+    if diff is None or untracked is None:
+        return None
+
+    changed = []
+    removed = []
+    fields = diff.split("\0")
+    i = 0
+    while i < len(fields) - 1:
+        status = fields[i]
+        if status.startswith(("R", "C")):
+            old_path, new_path = fields[i + 1], fields[i + 2]
+            if status.startswith("R"):
+                removed.append(old_path)
+            changed.append(new_path)
+            i += 3
+            continue
+        if status.startswith("D"):
+            removed.append(fields[i + 1])
+        else:
+            changed.append(fields[i + 1])
+        i += 2
+    changed.extend(path for path in untracked.split("\0") if path)
+
+    return (
+        [os.path.join(folder, path) for path in changed],
+        [os.path.join(folder, path) for path in removed],
+    )
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from collections import OrderedDict
+try:
+    from . import key_order
+except ImportError:  # run directly as a script
+    import key_order
 
 
 def optimise_autopkg_recipes(recipe):
@@ -12,41 +15,12 @@ def optimise_autopkg_recipes(recipe):
        moved to the end, ensuring the Processor key is first.
     2. Ensure the NAME key is the first item in the Input dictionary.
     3. Order the items such that the Input and Process dictionaries are at the end.
-    """
-
-    if "Process" in recipe:
-        process = recipe["Process"]
-        new_process = []
-        for processor in process:
-            processor = OrderedDict(processor)
-            if "Comment" in processor:
-                processor.move_to_end("Comment")
-            if "Arguments" in processor:
-                processor.move_to_end("Arguments")
-            new_process.append(processor)
-        recipe["Process"] = new_process
 
-    if "Input" in recipe:
-        input = recipe["Input"]
-        if "NAME" in input:
-            input = OrderedDict(reversed(list(input.items())))
-            input.move_to_end("NAME")
-        recipe["Input"] = OrderedDict(reversed(list(input.items())))
-
-    desired_order = [
-        "Comment",
-        "Description",
-        "Identifier",
-        "ParentRecipe",
-        "MinimumVersion",
-        "Input",
-        "Process",
-        "ParentRecipeTrustInfo",
-    ]
-    desired_list = [k for k in desired_order if k in recipe]
-    reordered_recipe = {k: recipe[k] for k in desired_list}
-    reordered_recipe = OrderedDict(reordered_recipe)
-    return reordered_recipe
+    Keys not covered by the "autopkg" key order profile are kept, after the
+    known leading keys. The conversion scripts apply the profile while writing
+    the yaml instead, which avoids copying the recipe.
+    """
+    return key_order.apply_profile(recipe, "autopkg")
 
 
 def format_autopkg_recipes(output):
@@ -65,7 +39,6 @@ def format_autopkg_recipes(output):
         # convert quoted strings with newlines in them to scalars
         if "\\n" in line:
             spaces = len(line) - len(line.lstrip()) + 2
-            print(spaces)
             space = " "
             line = line.replace(': "', ": |\n{}".format(space * spaces))
             line = line.replace("\\t", "    ")
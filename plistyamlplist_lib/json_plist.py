@@ -18,6 +18,15 @@ import json
 import sys
 import os.path
 
+try:
+    from . import compact
+    from . import compression
+    from . import plist_stream
+except ImportError:  # run directly as a script
+    import compact
+    import compression
+    import plist_stream
+
 try:  # python 3
     from plistlib import dumps as write_plist
 except ImportError:  # python 2
@@ -38,29 +47,54 @@ def clean_nones(value):
         return value
 
 
+def load_json(source, in_path):
+    """Parse json from a file or a string with None values removed, compacting
+    it as it is parsed if compact loading is enabled."""
+    if compact.settings["enabled"]:
+        return compact.load_json(source, in_path)
+    if isinstance(source, (str, bytes)):
+        return clean_nones(json.loads(source))
+    return clean_nones(json.load(source))
+
+
 def convert(data):
-    """Do the conversion"""
-    data = clean_nones(data)
+    """Do the conversion. None values must already have been removed."""
     return write_plist(data).decode()
 
 
-def json_plist(in_path, out_path):
-    """Convert json to plist."""
+def json_plist(in_path, out_path, stream=False, fallback=True):
+    """Convert json to plist. If stream is set, the plist is written while the
+    json is read, dropping None values on the way. If the json has duplicate
+    keys, it is loaded in full if fallback is set, and otherwise the file is
+    not converted and False is returned."""
+    if stream:
+        try:
+            if plist_stream.stream_plist(in_path, out_path, "json"):
+                print("Wrote to : {}\n".format(out_path))
+                return
+        except IOError:
+            print("ERROR: could not convert {}".format(in_path))
+            return
+        if not fallback:
+            print("ERROR: not converting {} without streaming\n".format(in_path))
+            return False
+        print("Loading {} in full".format(in_path))
     try:
-        with open(in_path, "r") as fp:
-            input_data = json.load(fp)
+        with compression.open_file(in_path, "r") as fp:
+            input_data = load_json(fp, in_path)
     except IOError:
         print("ERROR: {} not found".format(in_path))
         return
     try:
-        out_file = open(out_path, "w")
+        out_file = compression.open_file(out_path, "w")
     except IOError:
         print("ERROR: could not create {} ".format(out_path))
         return
 
     output = convert(input_data)
 
-    out_file.writelines(output)
+    with out_file:
+        out_file.writelines(output)
     print("Wrote to : {}\n".format(out_path))
 
 
@@ -75,9 +109,10 @@ def main():
         sys.argv[2]
     except Exception as e:
         print(e)  # TODO - temp to determine correct exception
-        if in_path.endswith(".json"):
-            filename, _ = os.path.splitext(in_path)
-            out_path = filename
+        plain_path, suffix = compression.split_suffix(in_path)
+        if plain_path.endswith(".json"):
+            filename, _ = os.path.splitext(plain_path)
+            out_path = filename + compression.output_suffix(suffix)
         else:
             print("Usage: json_plist.py <input-file> <output-file>")
             sys.exit(1)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Order the keys of dictionaries according to a profile while they are
+written out as YAML, rather than by rebuilding the data beforehand.
+
+A profile is a dictionary of rules:
+
+    {
+        "default": "sorted",
+        "rules": [
+            {"path": "", "first": ["Identifier"], "last": ["Process"]},
+            {"path": "Process/*", "first": ["Processor"], "last": ["Arguments"]},
+        ],
+    }
+
+Each rule applies to the dictionaries found at its path, a "/" separated list
+of keys in which "*" stands for any list item or any key. The keys listed in
+"first" are written first and those in "last" are written last, in the order
+given. Any other keys are kept between the two, in their original order, or
+sorted if the rule has "rest": "sorted". The first matching rule wins, and
+dictionaries matched by no rule are written according to "default", which is
+either "sorted" or "original".
+
+Profiles can be given by the name of a built-in profile, or as the path of a
+JSON or YAML file.
+"""
+
+import json
+import subprocess
+import sys
+
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+try:
+    from ruamel.yaml import safe_load
+    from ruamel.yaml.error import YAMLError
+    from ruamel.yaml.dumper import Dumper
+    from ruamel.yaml.nodes import MappingNode, SequenceNode
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "ensurepip", "--user"])
+    subprocess.check_call(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "-U",
+            "pip",
+            "setuptools",
+            "wheel",
+            "ruamel.yaml<0.18.0",
+            "--user",
+        ]
+    )
+    from ruamel.yaml import safe_load
+    from ruamel.yaml.error import YAMLError
+    from ruamel.yaml.dumper import Dumper
+    from ruamel.yaml.nodes import MappingNode, SequenceNode
+
+
+PROFILES = {
+    "autopkg": {
+        "default": "sorted",
+        "rules": [
+            {
+                "path": "",
+                "first": [
+                    "Comment",
+                    "Description",
+                    "Identifier",
+                    "ParentRecipe",
+                    "MinimumVersion",
+                ],
+                "last": ["Input", "Process", "ParentRecipeTrustInfo"],
+            },
+            {"path": "Input", "first": ["NAME"]},
+            {
+                "path": "Process/*",
+                "first": ["Processor"],
+                "last": ["Comment", "Arguments"],
+            },
+        ],
+    },
+    "munki": {
+        "default": "sorted",
+        "rules": [
+            {
+                "path": "",
+                "first": [
+                    "name",
+                    "display_name",
+                    "version",
+                    "description",
+                    "category",
+                    "developer",
+                    "catalogs",
+                ],
+                "last": [
+                    "installer_item_location",
+                    "installer_item_hash",
+                    "installer_item_size",
+                    "installed_size",
+                    "installs",
+                    "receipts",
+                    "_metadata",
+                ],
+                "rest": "sorted",
+            },
+            {"path": "installs/*", "first": ["type", "path"], "rest": "sorted"},
+            {"path": "receipts/*", "first": ["packageid", "version"], "rest": "sorted"},
+        ],
+    },
+    "profile": {
+        "default": "sorted",
+        "rules": [
+            {
+                "path": "",
+                "first": [
+                    "PayloadDisplayName",
+                    "PayloadDescription",
+                    "PayloadIdentifier",
+                    "PayloadOrganization",
+                    "PayloadType",
+                    "PayloadUUID",
+                    "PayloadVersion",
+                    "PayloadScope",
+                ],
+                "last": ["PayloadContent"],
+                "rest": "sorted",
+            },
+            {
+                "path": "PayloadContent/*",
+                "first": [
+                    "PayloadDisplayName",
+                    "PayloadIdentifier",
+                    "PayloadType",
+                    "PayloadUUID",
+                    "PayloadVersion",
+                ],
+                "rest": "sorted",
+            },
+        ],
+    },
+}
+
+
+def load_profile(name):
+    """Return the profile with the given built-in name, or load it from a JSON
+    or YAML file. Returns None if it cannot be found or is not valid."""
+    if isinstance(name, dict):
+        return name
+    if name in PROFILES:
+        return PROFILES[name]
+    try:
+        with open(name, "r") as fp:
+            if name.endswith(".json"):
+                profile = json.load(fp)
+            else:
+                profile = safe_load(fp)
+    except (IOError, ValueError, YAMLError):
+        print("ERROR: could not read key order profile {}".format(name))
+        return None
+    if not isinstance(profile, dict) or not isinstance(profile.get("rules"), list):
+        print("ERROR: key order profile {} has no list of rules".format(name))
+        return None
+    for rule in profile["rules"]:
+        if not valid_rule(rule):
+            print(
+                "ERROR: key order profile {} has an invalid rule: {}".format(name, rule)
+            )
+            return None
+    return profile
+
+
+def valid_rule(rule):
+    """Check that a rule is a dictionary with a path, and lists of keys for
+    "first" and "last" if it has them."""
+    return (
+        isinstance(rule, dict)
+        and isinstance(rule.get("path"), str)
+        and isinstance(rule.get("first", []), list)
+        and isinstance(rule.get("last", []), list)
+    )
+
+
+def match_rule(profile, key_path):
+    """Return the first rule of the profile matching the given list of keys."""
+    for rule in profile["rules"]:
+        pattern = rule["path"].split("/") if rule["path"] else []
+        if len(pattern) == len(key_path) and all(
+            fnmatchcase(key, part) for key, part in zip(key_path, pattern)
+        ):
+            return rule
+    return None
+
+
+def ordered_keys(mapping, rule, default="sorted"):
+    """Return the keys of mapping in the order given by rule."""
+    if rule is None:
+        rest = list(mapping)
+        if default == "sorted":
+            try:
+                rest.sort()
+            except TypeError:
+                pass
+        return rest
+    first = [key for key in rule.get("first", []) if key in mapping]
+    last = [key for key in rule.get("last", []) if key in mapping]
+    placed = set(first) | set(last)
+    rest = [key for key in mapping if key not in placed]
+    if rule.get("rest", "original") == "sorted":
+        try:
+            rest.sort()
+        except TypeError:
+            pass
+    return first + rest + last
+
+
+def apply_profile(data, profile, key_path=None):
+    """Return a copy of data with the dictionaries matched by the profile
+    rebuilt as OrderedDicts. This is only needed by callers which want the
+    ordered data itself; for YAML output use dumper_for instead."""
+    profile = load_profile(profile)
+    if key_path is None:
+        key_path = []
+    if isinstance(data, dict):
+        rule = match_rule(profile, key_path)
+        ordered = OrderedDict()
+        for key in ordered_keys(data, rule, profile.get("default", "sorted")):
+            ordered[key] = apply_profile(data[key], profile, key_path + [str(key)])
+        return ordered
+    if isinstance(data, list):
+        return [apply_profile(item, profile, key_path + ["*"]) for item in data]
+    return data
+
+
+class KeyOrderDumper(Dumper):
+    """Dumper which orders the keys of each dictionary by its profile as the
+    dictionary is represented, keeping track of the path to it."""
+
+    profile = {"default": "sorted", "rules": []}
+
+    def __init__(self, *args, **kwargs):
+        Dumper.__init__(self, *args, **kwargs)
+        self.key_path = []
+
+    def represent_ordered_mapping(self, data):
+        rule = match_rule(self.profile, self.key_path)
+        value = []
+        node = MappingNode("tag:yaml.org,2002:map", value)
+        # register the node before its children, as represent_mapping does,
+        # so that objects appearing again are written as aliases of it
+        if self.alias_key is not None:
+            self.represented_objects[self.alias_key] = node
+        for key in ordered_keys(data, rule, self.profile.get("default", "sorted")):
+            self.key_path.append(str(key))
+            value.append((self.represent_key(key), self.represent_data(data[key])))
+            self.key_path.pop()
+        return node
+
+    def represent_ordered_sequence(self, data):
+        value = []
+        node = SequenceNode("tag:yaml.org,2002:seq", value)
+        if self.alias_key is not None:
+            self.represented_objects[self.alias_key] = node
+        self.key_path.append("*")
+        for item in data:
+            value.append(self.represent_data(item))
+        self.key_path.pop()
+        return node
+
+
+KeyOrderDumper.add_representer(dict, KeyOrderDumper.represent_ordered_mapping)
+KeyOrderDumper.add_representer(OrderedDict, KeyOrderDumper.represent_ordered_mapping)
+KeyOrderDumper.add_representer(list, KeyOrderDumper.represent_ordered_sequence)
+
+
+class NoAliasDumper(Dumper):
+    """Dumper which writes an object in full each time it appears, rather than
+    as an anchor and aliases, for data whose equal parts have been shared by
+    compact loading."""
+
+    def ignore_aliases(self, data):
+        return True
+
+
+def dumper_for(profile, aliases=True):
+    """Return a Dumper class which applies the given profile, and writes
+    objects that appear more than once as aliases if aliases is set."""
+    attrs = {"profile": profile}
+    if not aliases:
+        attrs["ignore_aliases"] = NoAliasDumper.ignore_aliases
+    return type("KeyOrderDumper", (KeyOrderDumper,), attrs)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Track the peak memory use of each file converted in a batch run, and keep
+files that would use too much memory from taking down the run.
+
+The memory a conversion needs is estimated from the size of the input file
+and the conversion being done. Files over the budget set with
+set_max_memory are converted while they are read if the conversion can be
+streamed, and skipped with an error otherwise. Peaks are measured with
+tracemalloc, so they cover the memory allocated by Python, not the size of
+the whole process.
+"""
+
+import os
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    from . import compression
+except ImportError:  # run directly as a script
+    import compression
+
+# peak memory use as a multiple of the uncompressed size of the input file,
+# measured on munki catalogs, and rounded up
+FACTORS = {
+    ("plist", "yaml"): 30,
+    ("yaml", "plist"): 40,
+    ("yaml", "yaml"): 60,
+    ("json", "plist"): 15,
+}
+
+# for conversions to several formats at once, and anything else
+DEFAULT_FACTOR = 60
+
+# conversions that can be streamed, with memory use bounded by nesting depth
+STREAMABLE = (("yaml", "plist"), ("json", "plist"))
+
+# the assumed compression ratio of compressed input files
+COMPRESSION_RATIO = 10
+
+UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+# the memory budget of each file in bytes, and whether peaks are tracked
+settings = {"max_memory": None, "track": False}
+
+# (path, peak, note) for each file tracked or skipped
+records = []
+
+
+def parse_size(value):
+    """Parse a size such as 512M, 2G or 1048576. Returns the size in bytes,
+    or None if the value is not valid."""
+    value = value.strip().upper()
+    if value.endswith("B"):
+        value = value[:-1]
+    unit = value[-1:] if value[-1:] in UNITS else ""
+    try:
+        size = float(value[: len(value) - len(unit)])
+    except ValueError:
+        return None
+    if size <= 0:
+        return None
+    return int(size * UNITS[unit])
+
+
+def format_size(size):
+    """Format a size in bytes for people to read."""
+    if size < 1024:
+        return "{} B".format(size)
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024.0
+        if size < 1024 or unit == "GB":
+            return "{:.1f} {}".format(size, unit)
+
+
+def set_max_memory(max_memory):
+    """Set the memory budget of each file in bytes, or None for no budget."""
+    settings["max_memory"] = max_memory
+
+
+def set_tracking(track):
+    """Turn tracking of the peak memory of each file on or off."""
+    settings["track"] = track
+
+
+def estimate(path, in_format, out_format=None, size=None):
+    """Estimate the peak memory in bytes of converting a file. size is the
+    size of the contents if they are already in memory, uncompressed."""
+    if size is None:
+        size = os.path.getsize(path)
+        if compression.detect_codec(path):
+            size *= COMPRESSION_RATIO
+    return size * FACTORS.get((in_format, out_format), DEFAULT_FACTOR)
+
+
+def plan(path, in_format, out_format=None, size=None):
+    """Decide how to convert a file within the memory budget. Returns
+    "convert", "stream" or "skip". Files already in memory, given with their
+    size, cannot be streamed. Skipped files are recorded and reported."""
+    if not settings["max_memory"]:
+        return "convert"
+    estimated = estimate(path, in_format, out_format, size)
+    if estimated <= settings["max_memory"]:
+        return "convert"
+    if size is None and (in_format, out_format) in STREAMABLE:
+        print(
+            "Streaming {}: estimated memory use of {} is over --max-memory, so "
+            "keys are written in their original order rather than "
+            "sorted".format(path, format_size(estimated))
+        )
+        return "stream"
+    print(
+        "ERROR: skipping {}: estimated memory use of {} is over --max-memory "
+        "of {}\n".format(
+            path, format_size(estimated), format_size(settings["max_memory"])
+        )
+    )
+    skip(path)
+    return "skip"
+
+
+def skip(path):
+    """Record that a file was skipped for being over the memory budget,
+    including one that was sent to streaming but could not be streamed."""
+    records[:] = [record for record in records if record[0] != path]
+    records.append((path, None, "skipped"))
+
+
+@contextmanager
+def tracked(path, note=""):
+    """Record the peak memory used while converting a file, if tracking."""
+    if not settings["track"]:
+        yield
+        return
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        records.append((path, tracemalloc.get_traced_memory()[1], note))
+        if started:
+            tracemalloc.stop()
+
+
+def print_report(limit=20):
+    """Print the files that used the most memory, and any that were skipped."""
+    if not records:
+        return
+    peaks = sorted(
+        (record for record in records if record[1] is not None),
+        key=lambda record: record[1],
+        reverse=True,
+    )
+    skipped = [record[0] for record in records if record[1] is None]
+    if peaks:
+        print("Peak memory use of {} files:".format(len(peaks)))
+        for path, peak, note in peaks[:limit]:
+            print(
+                "  {:>10}  {}{}".format(
+                    format_size(peak), path, " ({})".format(note) if note else ""
+                )
+            )
+        if len(peaks) > limit:
+            print("  ... and {} more".format(len(peaks) - limit))
+    if skipped:
+        print("Skipped {} files over --max-memory:".format(len(skipped)))
+        for path in skipped:
+            print("  " + path)
+    print("")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Write several output formats from a single parse of the input file.
+
+If this script is run directly, it takes an input file, a comma-separated list
+of output formats and optionally the path of the plist output from the command
+line:
+
+multi_emit.py <input-file> <formats> [<plist-output-file>]
+
+The formats are yaml, plist and json. The plist output file can be omitted.
+In this case, it is taken from the input file, with .yaml or .json removed
+from the end. The yaml and json output files are named after the plist output
+file, with .yaml or .json added to the end. Output in the same format as the
+input file is written back to the input file if it is YAML, so that it is
+tidied, and skipped otherwise.
+"""
+
+import base64
+import datetime
+import json
+import os.path
+import subprocess
+import sys
+
+try:
+    from plistlib import load as load_plist  # Python 3
+    from plistlib import loads as loads_plist
+except ImportError:
+    from plistlib import readPlist as load_plist  # Python 2
+    from plistlib import readPlistFromString as loads_plist
+
+try:
+    from ruamel.yaml.constructor import DuplicateKeyError
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "ensurepip", "--user"])
+    subprocess.check_call(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "-U",
+            "pip",
+            "setuptools",
+            "wheel",
+            "ruamel.yaml<0.18.0",
+            "--user",
+        ]
+    )
+    from ruamel.yaml.constructor import DuplicateKeyError
+
+try:
+    from . import compact
+    from . import compression
+    from . import handle_autopkg_recipes
+    from . import key_order
+    from .json_plist import load_json
+    from .plist_yaml import convert as convert_yaml
+    from .plist_yaml import normalize_types
+    from .yaml_plist import convert as convert_plist
+except ImportError:  # run directly as a script
+    import compact
+    import compression
+    import handle_autopkg_recipes
+    import key_order
+    from json_plist import load_json
+    from plist_yaml import convert as convert_yaml
+    from plist_yaml import normalize_types
+    from yaml_plist import convert as convert_plist
+
+FORMATS = ("yaml", "plist", "json")
+
+RECIPE_SUFFIXES = (".recipe", ".recipe.plist", ".recipe.yaml")
+
+
+def parse_formats(value):
+    """Parse a comma-separated list of output formats.
+    Returns a list of formats, or None if any of them is unknown."""
+    formats = [fmt.strip() for fmt in value.split(",") if fmt.strip()]
+    if not formats or any(fmt not in FORMATS for fmt in formats):
+        return None
+    return formats
+
+
+def plist_base(dest_path, in_format):
+    """Return the path of the plist output, given the path the input file
+    would be converted to on its own, which is the yaml path for a plist
+    input file and the plist path otherwise. Any compression suffix is kept."""
+    if in_format != "plist":
+        return dest_path
+    dest_path, suffix = compression.split_suffix(dest_path)
+    if dest_path.endswith(".yaml"):
+        return dest_path[: -len(".yaml")] + suffix
+    filename, _ = os.path.splitext(dest_path)
+    return filename + suffix
+
+
+def derived_path(base_path, fmt):
+    """Return the path of an output format, named after the plist output,
+    with the format added before any compression suffix."""
+    if fmt == "plist":
+        return base_path
+    base_path, suffix = compression.split_suffix(base_path)
+    return "{}.{}{}".format(base_path, fmt, suffix)
+
+
+def output_paths(in_path, in_format, base_path, formats, in_place=True):
+    """Return (format, path) pairs for each requested output format. yaml
+    output from yaml input is written back to the input file if in_place is
+    set, and next to the other outputs otherwise, so that converting into an
+    output folder leaves the sources alone."""
+    outputs = []
+    for fmt in formats:
+        if fmt != in_format or (fmt == "yaml" and not in_place):
+            outputs.append((fmt, derived_path(base_path, fmt)))
+        elif fmt == "yaml":
+            outputs.append((fmt, in_path))
+        else:
+            print("Not rewriting {} as {}\n".format(in_path, fmt))
+    return outputs
+
+
+def load(in_path, in_format):
+    """Parse and normalise the input file, compacting it if compact loading
+    is enabled."""
+    if in_format == "plist":
+        with compression.open_file(in_path, "rb") as in_file:
+            data = load_plist(in_file)
+        if compact.settings["enabled"]:
+            return compact.load(data, in_path)
+        return normalize_types(data)
+    with compression.open_file(in_path, "r") as in_file:
+        if in_format == "json":
+            return load_json(in_file, in_path)
+        return compact.load_yaml(in_file, in_path, share=False)
+
+
+def loads(content, in_format, name="<data>"):
+    """Parse and normalise the contents of a file held in memory, compacting
+    them if compact loading is enabled. name is used in the report of the
+    memory saved."""
+    if in_format == "plist":
+        data = loads_plist(content)
+        if compact.settings["enabled"]:
+            return compact.load(data, name)
+        return normalize_types(data)
+    content = content.decode("utf-8")
+    if in_format == "json":
+        return load_json(content, name)
+    return compact.load_yaml(content, name, share=False)
+
+
+def json_default(value):
+    """Represent the plist types that JSON has no type for."""
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError("{} is not JSON serializable".format(type(value).__name__))
+
+
+def render(data, fmt, in_path, profile=None):
+    """Render the parsed data in the given format. Only yaml input can have
+    anchors and aliases, so objects that appear more than once in data loaded
+    from other formats are written in full each time."""
+    plain_path, _ = compression.split_suffix(in_path)
+    aliases = plain_path.endswith(".yaml")
+    if fmt == "plist":
+        return convert_plist(data)
+    if fmt == "json":
+        return json.dumps(data, indent=4, default=json_default) + "\n"
+    if plain_path.endswith(RECIPE_SUFFIXES):
+        output = convert_yaml(
+            data, key_order.load_profile(profile or "autopkg"), aliases
+        )
+        return handle_autopkg_recipes.format_autopkg_recipes(output)
+    return convert_yaml(
+        data, key_order.load_profile(profile) if profile else None, aliases
+    )
+
+
+def multi_emit(in_path, in_format, base_path, formats, profile=None, in_place=True):
+    """Convert the input file to each of the requested formats, parsing it
+    only once. yaml input is only tidied in place if in_place is set."""
+    try:
+        data = load(in_path, in_format)
+    except IOError:
+        print("ERROR: {} not found".format(in_path))
+        return
+    except DuplicateKeyError:
+        print("ERROR: Duplicate key found in {}\n".format(in_path))
+        return
+
+    for fmt, out_path in output_paths(in_path, in_format, base_path, formats, in_place):
+        output = render(data, fmt, in_path, profile)
+        try:
+            with compression.open_file(out_path, "w") as out_file:
+                out_file.write(output)
+        except IOError:
+            print("ERROR: could not create {} ".format(out_path))
+            continue
+        print("Wrote to : {}\n".format(out_path))
+
+
+def main():
+    """Get the command line inputs if running this script directly."""
+    if len(sys.argv) < 3:
+        print("Usage: multi_emit.py <input-file> <formats> [<plist-output-file>]")
+        sys.exit(1)
+
+    in_path = sys.argv[1]
+    formats = parse_formats(sys.argv[2])
+    if not formats:
+        print("Formats must be a comma-separated list of yaml, plist and json")
+        sys.exit(1)
+
+    plain_path, suffix = compression.split_suffix(in_path)
+    if plain_path.endswith((".yaml", ".json")):
+        in_format = plain_path.rsplit(".", 1)[1]
+    else:
+        in_format = "plist"
+    try:
+        base_path = sys.argv[3]
+    except IndexError:
+        if in_format != "plist":
+            plain_path, _ = os.path.splitext(plain_path)
+        base_path = plain_path + compression.output_suffix(suffix)
+
+    multi_emit(in_path, in_format, base_path, formats)
+
+
+if __name__ == "__main__":
+    main()
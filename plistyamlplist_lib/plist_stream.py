@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Convert YAML or JSON to an XML plist while reading it, without loading the
+whole file into memory.
+
+YAML parser events and JSON tokens are turned into a common stream of events,
+which are written out as plist elements straight away. JSON null values, and
+the keys that hold them, are dropped as they are met, as json_plist.py drops
+them; YAML null values are an error, as they are for yaml_plist.py. Memory use depends on how
+deeply the data is nested, not on the size of the file.
+
+The output is the same as that of yaml_plist.py and json_plist.py, except that
+dictionary keys are written in the order they are read rather than sorted.
+Files using YAML merge keys or explicitly tagged collections, containing
+duplicate keys, or holding more than one YAML document, cannot be streamed;
+the streaming functions then return False so that the caller can fall back to
+a full load. The output file is only replaced once the whole input has been
+converted.
+"""
+
+import binascii
+import datetime
+import re
+import subprocess
+import sys
+
+from json.decoder import JSONDecodeError, scanstring
+from json.scanner import NUMBER_RE
+
+try:
+    from ruamel.yaml import SafeLoader
+    from ruamel.yaml.events import (
+        AliasEvent,
+        MappingEndEvent,
+        MappingStartEvent,
+        ScalarEvent,
+        SequenceEndEvent,
+        SequenceStartEvent,
+        DocumentEndEvent,
+        DocumentStartEvent,
+    )
+    from ruamel.yaml.nodes import ScalarNode
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "ensurepip", "--user"])
+    subprocess.check_call(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "-U",
+            "pip",
+            "setuptools",
+            "wheel",
+            "ruamel.yaml<0.18.0",
+            "--user",
+        ]
+    )
+    from ruamel.yaml import SafeLoader
+    from ruamel.yaml.events import (
+        AliasEvent,
+        MappingEndEvent,
+        MappingStartEvent,
+        ScalarEvent,
+        SequenceEndEvent,
+        SequenceStartEvent,
+        DocumentEndEvent,
+        DocumentStartEvent,
+    )
+    from ruamel.yaml.nodes import ScalarNode
+
+try:
+    from . import compression
+except ImportError:  # run directly as a script
+    import compression
+
+PLIST_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" '
+    '"http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n'
+    '<plist version="1.0">\n'
+)
+
+CONTROL_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+NUMBER_CHARS = re.compile(r"[-+.0-9eE]*$")
+
+JSON_CONSTANTS = {
+    "true": True,
+    "false": False,
+    "null": None,
+    "NaN": float("nan"),
+    "Infinity": float("inf"),
+    "-Infinity": float("-inf"),
+}
+
+YAML_MAP = "tag:yaml.org,2002:map"
+YAML_SEQ = "tag:yaml.org,2002:seq"
+YAML_MERGE = "tag:yaml.org,2002:merge"
+
+
+class StreamingUnsupported(Exception):
+    """The input uses a feature that can only be converted after a full load."""
+
+
+def escape(text):
+    """Escape a string for XML in the same way as plistlib."""
+    if CONTROL_CHARS.search(text):
+        raise ValueError("strings can't contain control characters; use bytes instead")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+class PlistStreamWriter(object):
+    """Write events as XML plist elements, formatted like plistlib.
+
+    Containers are only opened once their first value is written, so that
+    containers left empty by dropped None values are written as <dict/> or
+    <array/>. Only the open containers and their keys are kept in memory.
+    """
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        # each open container is [tag, opened, keys seen]
+        self.stack = []
+        self.pending_key = None
+        self.level = 0
+
+    def writeln(self, line):
+        self.out_file.write("\t" * self.level + line + "\n")
+
+    def begin_value(self):
+        """Open the enclosing container and write the key of this value."""
+        if self.stack and not self.stack[-1][1]:
+            self.writeln("<{}>".format(self.stack[-1][0]))
+            self.level += 1
+            self.stack[-1][1] = True
+        if self.pending_key is not None:
+            self.writeln("<key>{}</key>".format(escape(self.pending_key)))
+            self.pending_key = None
+
+    def start(self, tag):
+        self.begin_value()
+        self.stack.append([tag, False, set() if tag == "dict" else None])
+
+    def end(self):
+        tag, opened, _ = self.stack.pop()
+        if opened:
+            self.level -= 1
+            self.writeln("</{}>".format(tag))
+        else:
+            self.writeln("<{}/>".format(tag))
+
+    def key(self, key):
+        if not isinstance(key, str):
+            raise TypeError("keys must be strings")
+        keys = self.stack[-1][2]
+        if key in keys:
+            raise StreamingUnsupported("duplicate key {}".format(key))
+        keys.add(key)
+        self.pending_key = key
+
+    def value(self, value):
+        if value is None and self.stack:
+            self.pending_key = None
+            return
+        self.begin_value()
+        if isinstance(value, str):
+            self.writeln("<string>{}</string>".format(escape(value)))
+        elif value is True:
+            self.writeln("<true/>")
+        elif value is False:
+            self.writeln("<false/>")
+        elif isinstance(value, int):
+            if not -1 << 63 <= value < 1 << 64:
+                raise OverflowError(value)
+            self.writeln("<integer>{:d}</integer>".format(value))
+        elif isinstance(value, float):
+            self.writeln("<real>{!r}</real>".format(value))
+        elif isinstance(value, (bytes, bytearray)):
+            self.write_bytes(value)
+        elif isinstance(value, datetime.datetime):
+            self.writeln(
+                "<date>{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}Z</date>".format(
+                    value.year,
+                    value.month,
+                    value.day,
+                    value.hour,
+                    value.minute,
+                    value.second,
+                )
+            )
+        else:
+            raise TypeError("unsupported type: %s" % type(value))
+
+    def write_bytes(self, data):
+        self.writeln("<data>")
+        maxlinelength = max(16, 76 - 8 * self.level)
+        maxbinsize = (maxlinelength // 4) * 3
+        for i in range(0, len(data), maxbinsize):
+            line = binascii.b2a_base64(data[i : i + maxbinsize]).decode("ascii")
+            self.writeln(line.rstrip("\n"))
+        self.writeln("</data>")
+
+
+def write_events(events, out_file):
+    """Write a stream of ("start", "dict"|"array"), ("end",), ("key", key)
+    and ("value", value) events to out_file as an XML plist."""
+    writer = PlistStreamWriter(out_file)
+    out_file.write(PLIST_HEADER)
+    written = False
+    for event in events:
+        kind = event[0]
+        if kind == "start":
+            writer.start(event[1])
+        elif kind == "end":
+            writer.end()
+        elif kind == "key":
+            writer.key(event[1])
+        else:
+            writer.value(event[1])
+        written = written or not writer.stack
+    if not written:
+        raise ValueError("no data to convert")
+    out_file.write("</plist>\n")
+
+
+def yaml_events(in_file):
+    """Turn the events of the YAML parser into conversion events, resolving
+    and constructing scalars one at a time. Anchored nodes are recorded so
+    that aliases to them can be replayed."""
+    loader = SafeLoader(in_file)
+    anchors = {}
+    recordings = []
+    # each open collection is [is mapping, expecting a key]
+    stack = []
+
+    def handle(event):
+        if isinstance(event, AliasEvent):
+            if event.anchor not in anchors:
+                raise StreamingUnsupported("unknown alias {}".format(event.anchor))
+            for replayed in anchors[event.anchor]:
+                for converted in handle(replayed):
+                    yield converted
+            return
+        is_key = bool(stack) and stack[-1][0] and stack[-1][1]
+        if (
+            stack
+            and stack[-1][0]
+            and not isinstance(event, (MappingEndEvent, SequenceEndEvent))
+        ):
+            stack[-1][1] = not stack[-1][1]
+        if isinstance(event, ScalarEvent):
+            tag = event.tag
+            if tag is None or str(tag) == "!":
+                tag = loader.resolve(ScalarNode, event.value, event.implicit)
+            # newer versions of ruamel.yaml resolve to Tag objects
+            if str(tag) == YAML_MERGE:
+                raise StreamingUnsupported("merge keys")
+            if str(tag) not in loader.yaml_constructors:
+                raise StreamingUnsupported("tag {}".format(tag))
+            node = ScalarNode(tag, event.value, style=event.style)
+            value = loader.yaml_constructors[str(tag)](loader, node)
+            if value is None and not is_key:
+                # fail as a full load does, rather than drop it
+                raise TypeError("unsupported type: %s" % type(value))
+            yield ("key" if is_key else "value", value)
+        elif isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+            is_mapping = isinstance(event, MappingStartEvent)
+            if is_key:
+                raise StreamingUnsupported("collection as a key")
+            if event.tag is not None and str(event.tag) not in (
+                "!",
+                YAML_MAP if is_mapping else YAML_SEQ,
+            ):
+                raise StreamingUnsupported("tag {}".format(event.tag))
+            stack.append([is_mapping, True])
+            yield ("start", "dict" if is_mapping else "array")
+        else:
+            stack.pop()
+            yield ("end",)
+
+    while loader.check_event():
+        event = loader.get_event()
+        if isinstance(event, DocumentEndEvent):
+            # a full load refuses more than one document, so don't convert
+            # just the first
+            if loader.check_event(DocumentStartEvent):
+                raise StreamingUnsupported("more than one document")
+            break
+        if not isinstance(
+            event,
+            (
+                AliasEvent,
+                ScalarEvent,
+                MappingStartEvent,
+                SequenceStartEvent,
+                MappingEndEvent,
+                SequenceEndEvent,
+            ),
+        ):
+            continue
+        for recording in recordings:
+            recording[1].append(event)
+            if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+                recording[2] += 1
+            elif isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+                recording[2] -= 1
+        if getattr(event, "anchor", None) and not isinstance(event, AliasEvent):
+            is_collection = isinstance(event, (MappingStartEvent, SequenceStartEvent))
+            recordings.append([event.anchor, [event], 1 if is_collection else 0])
+        for recording in [r for r in recordings if r[2] == 0]:
+            anchors[recording[0]] = recording[1]
+            recordings.remove(recording)
+        for converted in handle(event):
+            yield converted
+    loader.dispose()
+
+
+class JSONTokens(object):
+    """Read JSON tokens from a text file a chunk at a time."""
+
+    def __init__(self, in_file, chunk_size=65536):
+        self.in_file = in_file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk, discarding what has already been consumed.
+        Returns False at the end of the file."""
+        if self.eof:
+            return False
+        data = self.in_file.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + data
+        self.pos = 0
+        return True
+
+    def next(self):
+        """Return the next token: one of {}[]:, or a ("value", value) pair,
+        or None at the end of the file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                break
+        if self.pos >= len(self.buffer):
+            return None
+        char = self.buffer[self.pos]
+        if char in "{}[]:,":
+            self.pos += 1
+            return char
+        if char == '"':
+            while True:
+                try:
+                    value, end = scanstring(self.buffer, self.pos + 1)
+                except JSONDecodeError:
+                    if self.fill():
+                        continue
+                    raise
+                self.pos = end
+                return ("value", value)
+        # make sure a number is not cut short at the end of the buffer
+        while NUMBER_CHARS.match(self.buffer, self.pos) and self.fill():
+            pass
+        match = NUMBER_RE.match(self.buffer, self.pos)
+        if match:
+            integer, frac, exp = match.groups()
+            self.pos = match.end()
+            if frac or exp:
+                return ("value", float(integer + (frac or "") + (exp or "")))
+            return ("value", int(integer))
+        for literal, value in JSON_CONSTANTS.items():
+            while len(self.buffer) - self.pos < len(literal) and self.fill():
+                pass
+            if self.buffer.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return ("value", value)
+        raise JSONDecodeError("Expecting value", self.buffer, self.pos)
+
+
+def json_events(in_file):
+    """Turn JSON tokens into conversion events."""
+    tokens = JSONTokens(in_file)
+    # True for each open object, False for each open array
+    stack = []
+
+    def read_key(token):
+        if not (isinstance(token, tuple) and isinstance(token[1], str)):
+            raise JSONDecodeError("Expecting property name", tokens.buffer, tokens.pos)
+        if tokens.next() != ":":
+            raise JSONDecodeError("Expecting ':' delimiter", tokens.buffer, tokens.pos)
+        return ("key", token[1])
+
+    token = tokens.next()
+    while True:
+        if token in ("{", "["):
+            stack.append(token == "{")
+            yield ("start", "dict" if token == "{" else "array")
+            token = tokens.next()
+            if token != ("}" if stack[-1] else "]"):
+                if stack[-1]:
+                    yield read_key(token)
+                    token = tokens.next()
+                continue
+            stack.pop()
+            yield ("end",)
+        elif isinstance(token, tuple):
+            yield token
+        else:
+            raise JSONDecodeError("Expecting value", tokens.buffer, tokens.pos)
+
+        # after a value, close containers until a comma starts the next value
+        while stack:
+            token = tokens.next()
+            if token == ("}" if stack[-1] else "]"):
+                stack.pop()
+                yield ("end",)
+                continue
+            if token != ",":
+                raise JSONDecodeError(
+                    "Expecting ',' delimiter", tokens.buffer, tokens.pos
+                )
+            token = tokens.next()
+            if stack[-1]:
+                yield read_key(token)
+                token = tokens.next()
+            break
+        else:
+            if tokens.next() is not None:
+                raise JSONDecodeError("Extra data", tokens.buffer, tokens.pos)
+            return
+
+
+def stream_plist(in_path, out_path, in_format):
+    """Convert a YAML or JSON file to a plist while reading it.
+    Returns False, leaving out_path as it was, if the file uses a feature
+    that cannot be streamed. out_path is only replaced once the whole file
+    has been converted, so errors part-way through never leave a truncated
+    plist behind."""
+    events = yaml_events if in_format == "yaml" else json_events
+    try:
+        with compression.open_file(in_path, "r") as in_file:
+            with compression.open_replacing(out_path, "w") as out_file:
+                write_events(events(in_file), out_file)
+    except StreamingUnsupported as e:
+        print("Cannot stream {} ({})".format(in_path, e))
+        return False
+    return True
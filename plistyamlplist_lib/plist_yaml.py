@@ -47,7 +47,16 @@ except ImportError:
     from ruamel.yaml import add_representer
     from ruamel.yaml.nodes import MappingNode
 
-from . import handle_autopkg_recipes
+try:
+    from . import compact
+    from . import compression
+    from . import handle_autopkg_recipes
+    from . import key_order
+except ImportError:  # run directly as a script
+    import compact
+    import compression
+    import handle_autopkg_recipes
+    import key_order
 
 
 def represent_ordereddict(dumper, data):
@@ -85,29 +94,57 @@ def normalize_types(input_data):
     return input_data
 
 
-def convert(xml):
-    """Do the conversion."""
+def convert(xml, profile=None, aliases=True):
+    """Do the conversion, ordering keys by the given key order profile.
+    Objects that appear more than once are written in full each time unless
+    aliases is set."""
+    if profile:
+        return dump(
+            xml,
+            Dumper=key_order.dumper_for(profile, aliases),
+            width=float("inf"),
+            default_flow_style=False,
+        )
     add_representer(OrderedDict, represent_ordereddict)
+    if not aliases:
+        return dump(
+            xml,
+            Dumper=key_order.NoAliasDumper,
+            width=float("inf"),
+            default_flow_style=False,
+        )
     return dump(xml, width=float("inf"), default_flow_style=False)
 
 
-def plist_yaml(in_path, out_path):
-    """Convert plist to yaml."""
-    with open(in_path, "rb") as in_file:
+def plist_yaml(in_path, out_path, profile=None):
+    """Convert plist to yaml, ordering keys by the given key order profile.
+    AutoPkg recipes use the "autopkg" profile unless another is given."""
+    with compression.open_file(in_path, "rb") as in_file:
         input_data = load_plist(in_file)
 
-    normalized = normalize_types(input_data)
+    if compact.settings["enabled"]:
+        normalized = compact.load(input_data, in_path)
+    else:
+        normalized = normalize_types(input_data)
 
     # handle conversion of AutoPkg recipes
-    if sys.version_info.major == 3 and in_path.endswith((".recipe", ".recipe.plist")):
-        normalized = handle_autopkg_recipes.optimise_autopkg_recipes(normalized)
-        output = convert(normalized)
+    plain_path, _ = compression.split_suffix(in_path)
+    if sys.version_info.major == 3 and plain_path.endswith(
+        (".recipe", ".recipe.plist")
+    ):
+        output = convert(
+            normalized, key_order.load_profile(profile or "autopkg"), aliases=False
+        )
         output = handle_autopkg_recipes.format_autopkg_recipes(output)
     else:
-        output = convert(normalized)
-
-    out_file = open(out_path, "w")
-    out_file.writelines(output)
+        output = convert(
+            normalized,
+            key_order.load_profile(profile) if profile else None,
+            aliases=False,
+        )
+
+    with compression.open_file(out_path, "w") as out_file:
+        out_file.writelines(output)
     print("Wrote to : {}\n".format(out_path))
 
 
@@ -122,7 +159,8 @@ def main():
     try:
         sys.argv[2]
     except Exception:
-        out_path = "%s.yaml" % in_path
+        plain_path, suffix = compression.split_suffix(in_path)
+        out_path = "%s.yaml%s" % (plain_path, compression.output_suffix(suffix))
     else:
         out_path = sys.argv[2]
 
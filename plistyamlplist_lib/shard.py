@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Split the files of a folder conversion deterministically across several
+shards, so that each node of a CI matrix can convert its own share.
+
+If this script is run directly, it takes a list of shard manifests from the
+command line and checks that together they cover every file exactly once:
+
+shard.py <manifest> [<manifest> ...]
+"""
+
+import hashlib
+import json
+import os.path
+import sys
+
+# each file costs this many bytes on top of its size, so that shards made of
+# many small files are balanced against shards made of a few large ones
+FILE_OVERHEAD = 4096
+
+
+def parse_shard(value):
+    """Parse an i/N shard specification, where i counts from 1.
+    Returns (i, N) or None if the value is not valid."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        return None
+    if count < 1 or index < 1 or index > count:
+        return None
+    return index, count
+
+
+def stable_hash(rel_path):
+    """Hash a relative path the same way on every machine and every run."""
+    return hashlib.sha1(rel_path.encode("utf-8")).hexdigest()
+
+
+def plan_digest(rel_paths):
+    """Fingerprint the full list of files, so that manifests written by shards
+    that saw different trees can be told apart."""
+    digest = hashlib.sha1()
+    for rel_path in sorted(rel_paths):
+        digest.update(rel_path.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def assign_shards(sizes, count):
+    """Assign each relative path to a shard numbered from 1.
+
+    sizes maps relative paths to file sizes. The largest files are placed
+    first, each on the shard with the least work so far, with ties broken by
+    the stable hash of the path, so every node computes the same plan.
+    """
+    loads = [0] * count
+    assignment = {}
+    ordered = sorted(sizes, key=lambda path: (-sizes[path], stable_hash(path)))
+    for rel_path in ordered:
+        start = int(stable_hash(rel_path), 16) % count
+        shard = min(
+            ((start + offset) % count for offset in range(count)),
+            key=lambda candidate: loads[candidate],
+        )
+        loads[shard] += sizes[rel_path] + FILE_OVERHEAD
+        assignment[rel_path] = shard + 1
+    return assignment
+
+
+def select_shard(jobs, in_path, index, count):
+    """Return the jobs belonging to shard index of count, and the manifest
+    describing them. Jobs for the same source file always stay together."""
+    sizes = {}
+    for _, source_path, _ in jobs:
+        rel_path = os.path.relpath(source_path, in_path)
+        if rel_path not in sizes:
+            try:
+                sizes[rel_path] = os.path.getsize(source_path)
+            except OSError:
+                # removed files have no size, but still need a shard
+                sizes[rel_path] = 0
+
+    names, manifest = select_names(sizes, index, count)
+    selected = [job for job in jobs if os.path.relpath(job[1], in_path) in names]
+    return selected, manifest
+
+
+def select_names(sizes, index, count):
+    """Return the set of relative paths belonging to shard index of count,
+    given the size of each, and the manifest describing them. This is used
+    directly for the members of an archive, which are not on disk."""
+    assignment = assign_shards(sizes, count)
+    names = set(rel_path for rel_path, shard in assignment.items() if shard == index)
+    manifest = {
+        "shard": index,
+        "shards": count,
+        "plan": plan_digest(sizes),
+        "total": len(sizes),
+        "files": sorted(names),
+    }
+    return names, manifest
+
+
+def manifest_path(index, count):
+    """Default name of the manifest written by a shard."""
+    return "plistyamlplist-shard-{}-of-{}.json".format(index, count)
+
+
+def write_manifest(manifest, out_path):
+    """Write a shard manifest once all its jobs have been run."""
+    with open(out_path, "w") as fp:
+        json.dump(manifest, fp, indent=2)
+        fp.write("\n")
+    print("Wrote shard manifest to : {}\n".format(out_path))
+
+
+def check_manifests(paths):
+    """Check that a set of shard manifests come from the same plan and between
+    them cover every file exactly once. Returns True if they do."""
+    manifests = []
+    for path in paths:
+        try:
+            with open(path, "r") as fp:
+                manifests.append(json.load(fp))
+        except (IOError, ValueError):
+            print("ERROR: could not read shard manifest {}".format(path))
+            return False
+    if not manifests:
+        print("ERROR: no shard manifests given")
+        return False
+
+    first = manifests[0]
+    for manifest in manifests:
+        if (manifest["plan"], manifest["shards"]) != (first["plan"], first["shards"]):
+            print("ERROR: shard manifests were written from different plans")
+            return False
+
+    shards = sorted(manifest["shard"] for manifest in manifests)
+    missing = sorted(set(range(1, first["shards"] + 1)) - set(shards))
+    if missing:
+        print("ERROR: missing shards: {}".format(", ".join(map(str, missing))))
+        return False
+    if len(shards) != len(set(shards)):
+        print("ERROR: duplicate shard manifests given")
+        return False
+
+    files = [rel_path for manifest in manifests for rel_path in manifest["files"]]
+    if len(files) != len(set(files)) or len(files) != first["total"]:
+        print(
+            "ERROR: shards cover {} of {} files".format(len(set(files)), first["total"])
+        )
+        return False
+    print("All {} shards complete, {} files".format(first["shards"], len(files)))
+    return True
+
+
+def main():
+    """Get the command line inputs if running this script directly."""
+    if len(sys.argv) < 2:
+        print("Usage: shard.py <manifest> [<manifest> ...]")
+        sys.exit(1)
+
+    if not check_manifests(sys.argv[1:]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
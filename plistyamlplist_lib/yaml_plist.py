@@ -13,35 +13,23 @@ taken from the input file, with .yaml removed from the end.
 For best results, the input file should therefore be named with
 """
 
-import subprocess
 import sys
 import os.path
 
+try:
+    from . import compact
+    from . import compression
+    from . import plist_stream
+except ImportError:  # run directly as a script
+    import compact
+    import compression
+    import plist_stream
+
 try:  # python 3
     from plistlib import dumps as write_plist
 except ImportError:  # python 2
     from plistlib import writePlistToString as write_plist
 
-try:
-    from ruamel import yaml
-except ImportError:
-    subprocess.check_call([sys.executable, "-m", "ensurepip", "--user"])
-    subprocess.check_call(
-        [
-            sys.executable,
-            "-m",
-            "pip",
-            "install",
-            "-U",
-            "pip",
-            "setuptools",
-            "wheel",
-            "ruamel.yaml<0.18.0",
-            "--user",
-        ]
-    )
-    from ruamel import yaml
-
 
 def convert(data):
     """Do the conversion."""
@@ -50,23 +38,43 @@ def convert(data):
     return "\n".join(lines)
 
 
-def yaml_plist(in_path, out_path):
-    """Convert yaml to plist."""
+def yaml_plist(in_path, out_path, stream=False, fallback=True):
+    """Convert yaml to plist. If stream is set, the plist is written while the
+    yaml is read, unless the yaml uses features that need a full load. Then
+    the yaml is loaded in full if fallback is set, and otherwise the file is
+    not converted and False is returned."""
+    if stream:
+        try:
+            if plist_stream.stream_plist(in_path, out_path, "yaml"):
+                print("Written to " + out_path + "\n")
+                return
+        except IOError:
+            print("ERROR: could not convert " + in_path + "\n")
+            return
+        if not fallback:
+            print("ERROR: not converting " + in_path + " without streaming\n")
+            return False
+        print("Loading " + in_path + " in full")
     try:
-        in_file = open(in_path, "r")
+        in_file = compression.open_file(in_path, "r")
     except IOError:
         print("ERROR: could not find " + in_path + "\n")
         return
+
+    with in_file:
+        input_data = compact.load_yaml(in_file, in_path)
+    output = convert(input_data)
+
+    # only opened once the yaml has been read, so that a bad file does not
+    # leave an empty plist behind
     try:
-        out_file = open(out_path, "w")
+        out_file = compression.open_file(out_path, "w")
     except IOError:
         print("ERROR: could not create " + out_path + "\n")
         return
 
-    input_data = yaml.safe_load(in_file)
-    output = convert(input_data)
-
-    out_file.writelines(output)
+    with out_file:
+        out_file.writelines(output)
     print("Written to " + out_path + "\n")
 
 
@@ -80,9 +88,10 @@ def main():
     try:
         sys.argv[2]
     except Exception:
-        if in_path.endswith(".yaml"):
-            filename, _ = os.path.splitext(in_path)
-            out_path = filename
+        plain_path, suffix = compression.split_suffix(in_path)
+        if plain_path.endswith(".yaml"):
+            filename, _ = os.path.splitext(plain_path)
+            out_path = filename + compression.output_suffix(suffix)
         else:
             print("Usage: yaml_plist.py <input-file> <output-file>")
             sys.exit(1)
@@ -16,7 +16,7 @@ import sys
 from collections import OrderedDict
 
 try:
-    from ruamel.yaml import dump, safe_load, add_representer
+    from ruamel.yaml import dump, add_representer
     from ruamel.yaml.nodes import MappingNode
     from ruamel.yaml.constructor import DuplicateKeyError
 except ImportError:
@@ -35,11 +35,14 @@ except ImportError:
             "--user",
         ]
     )
-    from ruamel.yaml import dump, safe_load, add_representer
+    from ruamel.yaml import dump, add_representer
     from ruamel.yaml.nodes import MappingNode
     from ruamel.yaml.constructor import DuplicateKeyError
 
+from . import compact
+from . import compression
 from . import handle_autopkg_recipes
+from . import key_order
 
 
 def represent_ordereddict(dumper, data):
@@ -54,47 +57,59 @@ def represent_ordereddict(dumper, data):
     return MappingNode("tag:yaml.org,2002:map", value)
 
 
-def convert(xml):
-    """Do the conversion."""
+def convert(xml, profile=None):
+    """Do the conversion, ordering keys by the given key order profile."""
+    if profile:
+        return dump(
+            xml,
+            Dumper=key_order.dumper_for(profile),
+            width=float("inf"),
+            default_flow_style=False,
+        )
     add_representer(OrderedDict, represent_ordereddict)
     return dump(xml, width=float("inf"), default_flow_style=False)
 
 
-def tidy_yaml(in_path, out_path=""):
-    """Tidy up yaml file."""
-    if not in_path.endswith(".yaml"):
+def tidy_yaml(in_path, out_path="", profile=None):
+    """Tidy up yaml file, ordering keys by the given key order profile.
+    AutoPkg recipes use the "autopkg" profile unless another is given."""
+    plain_path, _ = compression.split_suffix(in_path)
+    if not plain_path.endswith(".yaml"):
         print("Not processing {}\n".format(in_path))
         return
 
     try:
-        in_file = open(in_path, "r")
+        in_file = compression.open_file(in_path, "r")
     except IOError:
         print("ERROR: {} not found".format(in_path))
         return
 
     try:
-        input_data = safe_load(in_file)
+        with in_file:
+            input_data = compact.load_yaml(in_file, in_path, share=False)
     except DuplicateKeyError:
         print("ERROR: Duplicate key found in {}\n".format(in_path))
         return
 
     # handle conversion of AutoPkg recipes
-    if sys.version_info.major == 3 and in_path.endswith(".recipe.yaml"):
-        input_data = handle_autopkg_recipes.optimise_autopkg_recipes(input_data)
-        output = convert(input_data)
+    if sys.version_info.major == 3 and plain_path.endswith(".recipe.yaml"):
+        output = convert(input_data, key_order.load_profile(profile or "autopkg"))
         output = handle_autopkg_recipes.format_autopkg_recipes(output)
     else:
-        output = convert(input_data)
+        output = convert(
+            input_data, key_order.load_profile(profile) if profile else None
+        )
 
     if not out_path:
         out_path = in_path
     try:
-        out_file = open(out_path, "w")
+        out_file = compression.open_file(out_path, "w")
     except IOError:
         print("ERROR: could not create {} ".format(out_path))
         return
     else:
-        out_file.writelines(output)
+        with out_file:
+            out_file.writelines(output)
         print("Wrote to : {}\n".format(out_path))
 
 